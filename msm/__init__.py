@@ -20,6 +20,7 @@
 # specific language governing permissions and limitations
 # under the License.
 from .exceptions import *
+from .mirror_cache import SkillMirrorCache
 from .mycroft_skills_manager import MycroftSkillsManager
 from .skill_entry import SkillEntry
 from .skill_repo import SkillRepo
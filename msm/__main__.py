@@ -25,6 +25,7 @@ import sys
 from logging import ERROR, INFO
 
 from msm.exceptions import MsmException
+from msm.mirror_cache import SkillMirrorCache
 from msm.mycroft_skills_manager import MycroftSkillsManager
 from msm.skill_repo import SkillRepo
 
@@ -58,6 +59,28 @@ def main(args=None, printer=print):
     parser.add_argument('-l', '--latest', action='store_false',
                         dest='versioned', help="Disable skill versioning")
     parser.add_argument('-r', '--raw', action='store_true')
+    parser.add_argument('-m', '--mirror-cache', action='store_true',
+                        help='clone skills through local mirrors, kept in '
+                             'the XDG cache dir by default')
+    parser.add_argument('--mirror-cache-dir',
+                        help='folder of the mirrors, implies --mirror-cache')
+    parser.add_argument('-s', '--shallow', action='store_true',
+                        help='install only the pinned commit of skills')
+    parser.add_argument('--batch-pip', action='store_true',
+                        help='install the python requirements of several '
+                             'skills with a single pip run')
+    parser.add_argument('--batch-system-packages', action='store_true',
+                        help='install the system packages of several skills '
+                             'with a single package manager run')
+    parser.add_argument('--fetch-interval', type=int,
+                        help='minimum number of seconds between fetches of '
+                             'the skills repo, 0 to always fetch')
+    parser.add_argument('-f', '--force-fetch', action='store_true',
+                        help='fetch the skills repo even if it was fetched '
+                             'within the fetch interval')
+    parser.add_argument('-w', '--wheelhouse',
+                        help='folder with wheels of the python requirements '
+                             'to install from and add built wheels to')
     parser.set_defaults(raw=False, versioned=True)
     subparsers = parser.add_subparsers(dest='action')
     subparsers.required = True
@@ -82,19 +105,48 @@ def main(args=None, printer=print):
     add_search_args(subparsers.add_parser('info'))
     subparsers.add_parser('list').add_argument('-i', '--installed',
                                                action='store_true')
-    add_search_args(subparsers.add_parser('update'), skill_is_optional=True)
+    update_parser = subparsers.add_parser('update')
+    add_search_args(update_parser, skill_is_optional=True)
+    update_parser.add_argument('-c', '--check', action='store_true',
+                               help='only list the skills with updates')
     subparsers.add_parser('default')
+    wheels_parser = subparsers.add_parser('build-wheels')
+    wheels_parser.add_argument('-c', '--catalog', action='store_true',
+                               help='build for all skills in the skills '
+                                    'repo instead of the installed ones')
+    add_constraint_args(wheels_parser)
     args = parser.parse_args(args or sys.argv[1:])
 
     if args.raw:
         LOG.level = ERROR
 
+    repo_args = {}
+    if args.force_fetch:
+        repo_args['fetch_interval'] = 0
+    elif args.fetch_interval is not None:
+        repo_args['fetch_interval'] = args.fetch_interval
     repo = SkillRepo(
-        url=args.repo_url, branch=args.repo_branch
+        url=args.repo_url, branch=args.repo_branch, **repo_args
     )
+    mirror_cache = None
+    if args.mirror_cache or args.mirror_cache_dir:
+        mirror_cache = SkillMirrorCache(args.mirror_cache_dir)
     msm = MycroftSkillsManager(
-        platform=args.platform, repo=repo, skills_dir=args.skills_dir, versioned=args.versioned
+        platform=args.platform, repo=repo, skills_dir=args.skills_dir,
+        versioned=args.versioned, mirror_cache=mirror_cache,
+        shallow_installs=args.shallow, batch_pip=args.batch_pip,
+        wheelhouse=args.wheelhouse,
+        batch_system_packages=args.batch_system_packages
     )
+
+    def update():
+        if not args.check:
+            return msm.update(args.skill, args.author)
+        skills = None
+        if args.skill:
+            skills = [msm.find_skill(args.skill, args.author)]
+        return '\n'.join(skill.name for skill in msm.check_updates(skills))
+
     main_functions = {
         'install': lambda: msm.install(args.skill, args.author,
                                        args.constraints, 'cli'),
@@ -106,14 +158,14 @@ def main(args=None, printer=print):
             for skill in msm.list()
             if not args.installed or skill.is_local
         ),
-        'update': lambda: msm.update(args.skill, args.author),
+        'update': update,
         'default': msm.install_defaults,
         'search': lambda: '\n'.join(
-            skill.name
-            for skill in msm.list()
-            if skill.match(args.skill, args.author) >= 0.3
+            skill.name for skill in msm.search(args.skill, args.author)
         ),
-        'info': lambda: skill_info(msm.find_skill(args.skill, args.author))
+        'info': lambda: skill_info(msm.find_skill(args.skill, args.author)),
+        'build-wheels': lambda: msm.build_wheels(args.catalog,
+                                                 args.constraints)
     }
     with msm.lock:
         try:
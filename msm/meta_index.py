@@ -0,0 +1,186 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Compact, memory-mapped index of the skills meta-data.
+
+The index is built from the cached skill-metadata.json and maps the lower
+case repo url of each skill to its meta-data entry. Only the entries that
+are looked up are decoded, the rest stays on disk.
+
+File layout, integers are unsigned 32 bit little endian:
+    header: magic, format version, sha1 of the source json, entry count
+    table:  key offset, key length, value offset, value length for each
+            entry, sorted by key
+    data:   utf-8 encoded keys and json encoded values
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'MSMI'
+INDEX_VERSION = 1
+HEADER = struct.Struct('<4sI20sI')
+ENTRY = struct.Struct('<IIII')
+
+
+def file_digest(path):
+    """Get the sha1 digest of the file at path."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def build_meta_index(meta_info, path, digest):
+    """Write an index for meta_info to path.
+
+    The index is written to a temporary file first and moved in place so
+    readers never see a partial index.
+
+    Arguments:
+        meta_info (dict): meta-data entries keyed by lower case repo url
+        path (str): path of the index file
+        digest (bytes): sha1 digest of the json the data was loaded from
+    """
+    entries = sorted(
+        (key.encode(), json.dumps(value).encode())
+        for key, value in meta_info.items()
+    )
+    offset = HEADER.size + ENTRY.size * len(entries)
+    table = []
+    for key, value in entries:
+        table.append(ENTRY.pack(offset, len(key),
+                                offset + len(key), len(value)))
+        offset += len(key) + len(value)
+
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, INDEX_VERSION, digest, len(entries)))
+        f.writelines(table)
+        for key, value in entries:
+            f.write(key)
+            f.write(value)
+    os.replace(tmp_path, path)
+
+
+class SkillsMetaIndex(Mapping):
+    """Read-only mapping backed by a memory-mapped index file.
+
+    Arguments:
+        path (str): path of an index written by build_meta_index
+
+    Raises:
+        ValueError: if the file is not a valid index
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError('Truncated skills meta index: ' + path)
+        magic, version, self.digest, self._count = HEADER.unpack_from(
+            self._map
+        )
+        if magic != MAGIC or version != INDEX_VERSION:
+            raise ValueError('Invalid skills meta index: ' + path)
+        if len(self._map) < HEADER.size + ENTRY.size * self._count:
+            raise ValueError('Truncated skills meta index: ' + path)
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * i)
+
+    def _key(self, entry):
+        key_offset, key_len, _, _ = entry
+        return self._map[key_offset:key_offset + key_len]
+
+    def __getitem__(self, key):
+        search = key.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            found = self._key(entry)
+            if found == search:
+                _, _, value_offset, value_len = entry
+                return json.loads(
+                    self._map[value_offset:value_offset + value_len].decode()
+                )
+            elif found < search:
+                low = middle + 1
+            else:
+                high = middle
+        raise KeyError(key)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(self._entry(i)).decode()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+
+def open_meta_index(source_path, index_path, load_meta_info, current=None):
+    """Open the index for the meta-data json at source_path.
+
+    The index is rebuilt if it is missing, invalid or was built from a
+    different version of the json. Rebuilding replaces the file, maps of
+    the previous index stay readable until they are garbage collected.
+
+    Arguments:
+        source_path (str): path of the cached skill-metadata.json
+        index_path (str): path of the index file
+        load_meta_info (callable): returns the meta-data of source_path
+                                   keyed by lower case repo url, only
+                                   called if the index is rebuilt
+        current (SkillsMetaIndex): index already open, returned as is if
+                                   it was built from the same json
+    Returns:
+        (Mapping) index of the meta-data, empty if source_path is missing
+    """
+    try:
+        digest = file_digest(source_path)
+    except FileNotFoundError:
+        return {}
+    if current is not None and current.digest == digest:
+        return current
+    try:
+        index = SkillsMetaIndex(index_path)
+        if index.digest == digest:
+            return index
+        index.close()
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        LOG.warning('Rebuilding skills meta index ({})'.format(e))
+
+    LOG.info('Building skills meta index')
+    build_meta_index(load_meta_info(), index_path, digest)
+    return SkillsMetaIndex(index_path)
@@ -0,0 +1,205 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Local cache of skill repositories shared between installs.
+
+Each skill url gets a bare mirror of its branches and tags. Installs clone
+from the mirror after fetching the missing objects into it, so reinstalls
+and installs into several skills folders are mostly local disk I/O.
+"""
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from os.path import getsize, isdir, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Lock
+
+from git import GitCommandError
+from xdg import BaseDirectory
+
+from msm.util import Git
+
+LOG = logging.getLogger(__name__)
+
+# Default limit of the total size of all mirrors
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+MIRROR_REFSPECS = ['+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*']
+
+
+def _dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += getsize(join(root, filename))
+            except OSError:
+                pass
+    return size
+
+
+class SkillMirrorCache(object):
+    """Bare mirrors of skill repos with size based eviction.
+
+    The sizes of the mirrors are measured once and then kept up to date
+    as mirrors are updated and removed. Mirrors created by other processes
+    sharing the folder are only counted after a restart.
+
+    Arguments:
+        path (str): folder holding the mirrors, defaults to the msm folder
+                    in the XDG cache dir
+        max_size (int): total size in bytes of the mirrors, the least
+                        recently used mirrors are removed above it
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path or BaseDirectory.save_cache_path('mycroft',
+                                                          'skill-mirrors')
+        self.max_size = max_size
+        # Guards the lock, use count and size dicts
+        self._locks_lock = Lock()
+        self._locks = {}
+        self._uses = {}
+        self._sizes = None
+        self._last_used = None
+        self._total_size = 0
+
+    def _lock(self, mirror):
+        with self._locks_lock:
+            return self._locks.setdefault(mirror, Lock())
+
+    def mirror_path(self, url):
+        """Get the path of the mirror for url."""
+        url = url.rstrip('/')
+        url = url[:-len('.git')] if url.endswith('.git') else url
+        digest = hashlib.sha1(url.lower().encode()).hexdigest()[:20]
+        return join(self.path, digest + '.git')
+
+    @contextmanager
+    def use(self, url):
+        """Update the mirror of url and keep it while cloning from it.
+
+        Mirrors in use are never evicted.
+
+        Arguments:
+            url (str): url of the skill repo
+        Yields:
+            (str) path of the mirror or None if it couldn't be updated
+        """
+        mirror = self.mirror_path(url)
+        with self._locks_lock:
+            self._uses[mirror] = self._uses.get(mirror, 0) + 1
+        try:
+            yield self.update(url)
+        finally:
+            with self._locks_lock:
+                self._uses[mirror] -= 1
+                if not self._uses[mirror]:
+                    del self._uses[mirror]
+
+    def update(self, url):
+        """Bring the mirror of url up to date, creating it if needed.
+
+        Use use() to clone from the mirror, an update alone doesn't keep
+        the mirror from being evicted afterwards.
+
+        Arguments:
+            url (str): url of the skill repo
+        Returns:
+            (str) path of the mirror or None if it couldn't be updated
+        """
+        mirror = self.mirror_path(url)
+        with self._lock(mirror):
+            try:
+                if isdir(mirror):
+                    LOG.debug('Updating mirror of ' + url)
+                    git = Git(mirror)
+                    git.config('remote.origin.url', url)
+                    git.fetch('origin', *MIRROR_REFSPECS, prune=True)
+                else:
+                    self._create(url, mirror)
+            except (GitCommandError, OSError) as e:
+                LOG.warning('Could not update mirror of {} ({})'.format(
+                    url, repr(e)
+                ))
+                return None
+            # The mtime marks when the mirror was last used
+            os.utime(mirror)
+            size = _dir_size(mirror)
+            with self._locks_lock:
+                self._load_sizes()
+                self._total_size += size - self._sizes.get(mirror, 0)
+                self._sizes[mirror] = size
+                self._last_used[mirror] = os.stat(mirror).st_mtime
+        self.evict(keep=mirror)
+        return mirror
+
+    def _create(self, url, mirror):
+        LOG.info('Creating mirror of ' + url)
+        # Clone next to the final location and move it in place when done
+        mirror_tmp = mkdtemp(dir=self.path, suffix='.tmp')
+        try:
+            Git(self.path).clone(url, mirror_tmp, bare=True)
+            os.rename(mirror_tmp, mirror)
+        except Exception:
+            rmtree(mirror_tmp, ignore_errors=True)
+            raise
+
+    def _load_sizes(self):
+        """Measure the mirrors on disk once, called with _locks_lock."""
+        if self._sizes is not None:
+            return
+        self._sizes, self._last_used = {}, {}
+        for name in os.listdir(self.path):
+            mirror = join(self.path, name)
+            if name.endswith('.git') and isdir(mirror):
+                self._sizes[mirror] = _dir_size(mirror)
+                self._last_used[mirror] = os.stat(mirror).st_mtime
+        self._total_size = sum(self._sizes.values())
+
+    def evict(self, keep=None):
+        """Remove least recently used mirrors above the size limit.
+
+        Mirrors in use are kept.
+
+        Arguments:
+            keep (str): path of a mirror that must not be removed
+        """
+        with self._locks_lock:
+            self._load_sizes()
+            mirrors = sorted(self._last_used, key=self._last_used.get)
+        for mirror in mirrors:
+            with self._locks_lock:
+                if self._total_size <= self.max_size:
+                    break
+            if mirror == keep:
+                continue
+            with self._lock(mirror):
+                with self._locks_lock:
+                    # Users update the mirror before cloning, which waits
+                    # for the mirror lock held here
+                    if self._uses.get(mirror) or mirror not in self._sizes:
+                        continue
+                    self._total_size -= self._sizes.pop(mirror)
+                    del self._last_used[mirror]
+                LOG.info('Removing mirror ' + mirror)
+                rmtree(mirror, ignore_errors=True)
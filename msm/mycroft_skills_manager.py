@@ -23,15 +23,21 @@
 
 MSM can be used on the command line but is also used by Mycroft core daemons.
 """
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from copy import copy
 import time
 import logging
 import shutil
 from functools import wraps
 from glob import glob
 from os import path
+from threading import BoundedSemaphore
 from typing import Dict, List
+from urllib.parse import urlparse
 
+from git import GitError
 from xdg import BaseDirectory
 
 from msm import GitException
@@ -40,11 +46,16 @@ from msm.exceptions import (
     AlreadyRemoved,
     MsmException,
     MultipleSkillMatches,
+    PipRequirementsException,
     RemoveException,
-    SkillNotFound
+    SkillNotFound,
+    SkillRequirementsException
 )
-from msm.skill_entry import SkillEntry
+from msm.pip_batch import PipBatch, build_wheels
+from msm.skill_collection import SkillCollection
+from msm.skill_entry import DEFAULT_CONSTRAINTS, SkillEntry
 from msm.skill_repo import SkillRepo
+from msm.skill_search import SkillSearchIndex
 from msm.skill_state import (
     initialize_skill_state,
     get_skill_state,
@@ -52,12 +63,56 @@ from msm.skill_state import (
     load_device_skill_state,
     device_skill_state_hash
 )
-from msm.util import cached_property, MsmProcessLock
+from msm.system_packages import SystemPackageBatch
+from msm.util import cached_property, LruCache, MsmProcessLock
 
 LOG = logging.getLogger(__name__)
 
 CURRENT_SKILLS_DATA_VERSION = 2
 ONE_DAY = 86400
+# Limit of concurrent update checks against one git host
+MAX_CHECKS_PER_HOST = 4
+# Number of find_skill results kept
+FIND_SKILL_CACHE_SIZE = 256
+
+
+def _find_cycle(graph):
+    """Find a cycle in a graph of dependency names.
+
+    Arguments:
+        graph (dict): names of the dependencies of each node
+    Returns:
+        (list) nodes of a cycle, starting and ending with the same node,
+        or None if the graph is acyclic
+    """
+    visited = set()
+    for root in graph:
+        if root in visited:
+            continue
+        # Iterative depth first search, path holds the current branch
+        path = [root]
+        on_path = {root}
+        stack = [iter(graph[root])]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                visited.add(path[-1])
+                on_path.discard(path.pop())
+                stack.pop()
+            elif node in on_path:
+                return path[path.index(node):] + [node]
+            elif node not in visited and node in graph:
+                path.append(node)
+                on_path.add(node)
+                stack.append(iter(graph[node]))
+    return None
+
+
+def _url_host(url):
+    """Get the host name of a git url, including scp-like ssh urls."""
+    if '://' in url:
+        return urlparse(url).hostname or ''
+    return url.rpartition('@')[2].partition(':')[0]
 
 
 def save_device_skill_state(func):
@@ -91,7 +146,10 @@ class MycroftSkillsManager(object):
                     'respeaker', 'mycroft_mark_2', 'mycroft_mark_2pi'}
 
     def __init__(self, platform='default', old_skills_dir=None,
-                 skills_dir=None, repo=None, versioned=True):
+                 skills_dir=None, repo=None, versioned=True,
+                 mirror_cache=None, shallow_installs=False,
+                 batch_pip=False, wheelhouse=None,
+                 batch_system_packages=False):
         self.platform = platform
 
         # Keep this variable alive for a while, is used to move skills from the
@@ -102,6 +160,14 @@ class MycroftSkillsManager(object):
 
         self.repo = repo or SkillRepo()
         self.versioned = versioned
+        self.mirror_cache = mirror_cache
+        self.shallow_installs = shallow_installs
+        self.batch_pip = batch_pip
+        self.wheelhouse = wheelhouse
+        self.batch_system_packages = batch_system_packages
+        # Collect the requirements while installing several skills
+        self.pip_batch = None
+        self.system_package_batch = None
         self.lock = MsmProcessLock()
 
         # Property placeholders
@@ -109,6 +175,10 @@ class MycroftSkillsManager(object):
         self._default_skills = None
         self._local_skills = None
         self._device_skill_state = None
+        self._search_index = None
+        self._search_index_generation = None
+        # Results of find_skill by name and author
+        self._find_skill_cache = LruCache(FIND_SKILL_CACHE_SIZE)
 
         self.saving_handled = False
         self.device_skill_state_hash = ''
@@ -140,15 +210,16 @@ class MycroftSkillsManager(object):
 
         return self._all_skills
 
-    def _get_all_skills(self):
+    def _get_all_skills(self, force=False):
         LOG.info('building SkillEntry objects for all skills')
-        self._refresh_skill_repo()
+        self._refresh_skill_repo(force)
         remote_skills = self._get_remote_skills()
+        remote_ids = list(remote_skills)
         all_skills = self._merge_remote_with_local(remote_skills)
 
-        return all_skills
+        return SkillCollection(all_skills, remote_ids)
 
-    def list(self):
+    def list(self, force=False):
         """Load a list of SkillEntry objects from both local and remote skills
 
         It is necessary to load both local and remote skills at
@@ -159,16 +230,20 @@ class MycroftSkillsManager(object):
         The return value of this function is cached in the all_skills property.
         Only call this method if you need a fresh version of the SkillEntry
         objects.
+
+        Arguments:
+            force (bool): fetch the skills repo even if it was fetched
+                          within its fetch interval
         """
-        all_skills = self._get_all_skills()
+        all_skills = self._get_all_skills(force)
         self._invalidate_skills_cache(new_value=all_skills)
 
         return all_skills
 
-    def _refresh_skill_repo(self):
+    def _refresh_skill_repo(self, force=False):
         """Get the latest mycroft-skills repo code."""
         try:
-            self.repo.update()
+            self.repo.update(force)
         except GitException as e:
             if not path.isdir(self.repo.path):
                 raise
@@ -212,14 +287,30 @@ class MycroftSkillsManager(object):
 
     @property
     def local_skills(self):
-        """Property containing a dictionary of local skills keyed by name."""
+        """Property containing a dictionary of local skills keyed by name.
+
+        The dictionary is a copy, changes don't affect the skill lists.
+        """
         if self._local_skills is None:
-            self._local_skills = {
-                s.name: s for s in self.all_skills if s.is_local
-            }
+            self._local_skills = self.all_skills.local_skills
 
         return self._local_skills
 
+    def check_dirty_skills(self):
+        """Determine which local skills differ from the catalog version.
+
+        The pinned shas are looked up once for all skills instead of once
+        per skill as the SkillEntry.is_dirty property does.
+
+        Returns:
+            (dict) skill name to dirty state (see SkillEntry.is_dirty)
+        """
+        skill_shas = self.repo.get_skill_shas()
+        return {
+            name: skill.check_dirty(skill_shas)
+            for name, skill in self.local_skills.items()
+        }
+
     @property
     def default_skills(self):
         if self._default_skills is None:
@@ -238,16 +329,17 @@ class MycroftSkillsManager(object):
 
     def list_all_defaults(self):  # type: () -> Dict[str, List[SkillEntry]]
         """Generate dictionary of default skills in all default skill groups"""
-        all_skills = {skill.name: skill for skill in self.all_skills}
+        all_skills = self.all_skills
         default_skills = {group: [] for group in self.SKILL_GROUPS}
 
         for group_name, skill_names in self.repo.get_default_skill_names():
             group_skills = []
             for skill_name in skill_names:
-                try:
-                    group_skills.append(all_skills[skill_name])
-                except KeyError:
+                skill = all_skills.get_by_name(skill_name)
+                if skill is None:
                     LOG.warning('No such default skill: ' + skill_name)
+                else:
+                    group_skills.append(skill)
             default_skills[group_name] = group_skills
 
         return default_skills
@@ -326,9 +418,9 @@ class MycroftSkillsManager(object):
 
     def _add_skills_to_state(self):
         """Add local skill to state if it is not already there."""
-        skill_names = [s['name'] for s in self._device_skill_state['skills']]
+        skill_states = self._device_skill_state['skills']
         for skill in self.local_skills.values():
-            if skill.name not in skill_names:
+            if skill_states.find(skill.name) is None:
                 origin = self._determine_skill_origin(skill)
                 skill_state = initialize_skill_state(
                     skill.name,
@@ -347,8 +439,7 @@ class MycroftSkillsManager(object):
             if is_not_local and is_installed_state:
                 skills_to_remove.append(skill)
 
-        for skill in skills_to_remove:
-            self._device_skill_state['skills'].remove(skill)
+        self._device_skill_state['skills'].remove_entries(skills_to_remove)
 
     def _update_skill_gid(self):
         for skill in self._device_skill_state['skills']:
@@ -378,11 +469,23 @@ class MycroftSkillsManager(object):
 
     @save_device_skill_state
     def install(self, param, author=None, constraints=None, origin=''):
-        """Install by url or name"""
+        """Install by url or name, after the skills it depends on"""
         if isinstance(param, SkillEntry):
             skill = param
         else:
             skill = self.find_skill(param, author)
+        if skill.is_local:
+            # Raises AlreadyInstalled
+            return self._install_skill(skill, constraints, origin)
+
+        graph = self._build_dependency_graph([skill])
+        errors = self._install_dependency_graph(graph, [skill.name],
+                                                constraints, origin)
+        if skill.name in errors:
+            raise errors[skill.name]
+
+    def _install_skill(self, skill, constraints=None, origin=''):
+        """Install a skill without the skills it depends on."""
         skill_state = initialize_skill_state(
             skill.name,
             origin,
@@ -390,7 +493,7 @@ class MycroftSkillsManager(object):
             skill.skill_gid
         )
         try:
-            skill.install(constraints)
+            skill.install(constraints, skill_requirements=False)
         except AlreadyInstalled:
             log_msg = 'Skill {} already installed - ignoring install request'
             LOG.info(log_msg.format(skill.name))
@@ -414,7 +517,219 @@ class MycroftSkillsManager(object):
             # Store the entry in the list
             if skill_state is not None:
                 self.device_skill_state['skills'].append(skill_state)
-                self._invalidate_skills_cache()
+                self._update_skills_cache(skill)
+
+    @staticmethod
+    def _skill_dependencies(skill):
+        """Get the names of the skills a skill depends on.
+
+        Skills that aren't installed yet are looked up in the skills repo
+        metadata, their skill_requirements.txt and manifest.yml are only
+        read after cloning them.
+        """
+        if skill.is_local:
+            return skill.dependent_skills
+        requirements = skill.meta_info.get('requirements') or {}
+        return requirements.get('skill') or []
+
+    def _build_dependency_graph(self, skills):
+        """Resolve the skills that skills depend on, recursively.
+
+        Arguments:
+            skills (list): skills to resolve the dependencies of
+        Returns:
+            (OrderedDict) skill and names of its dependencies by skill name
+        Raises:
+            SkillRequirementsException: if a dependency can't be found or
+                                        the dependencies are circular
+        """
+        graph = OrderedDict()
+        pending = list(skills)
+        while pending:
+            skill = pending.pop(0)
+            if skill.name in graph:
+                continue
+            dependencies = []
+            for dependency_name in self._skill_dependencies(skill):
+                try:
+                    dependency = self.find_skill(dependency_name)
+                except MsmException as e:
+                    raise SkillRequirementsException(e) from e
+                dependencies.append(dependency.name)
+                pending.append(dependency)
+            graph[skill.name] = (skill, dependencies)
+
+        cycle = _find_cycle({
+            name: dependencies for name, (_, dependencies) in graph.items()
+        })
+        if cycle:
+            raise SkillRequirementsException(
+                'Circular skill dependencies: ' + ' -> '.join(cycle)
+            )
+        return graph
+
+    def _install_dependency_graph(self, graph, roots, constraints=None,
+                                  origin='', max_threads=20):
+        """Install the skills of a dependency graph, dependencies first.
+
+        Skills are installed as soon as their dependencies are, in
+        parallel. Each skill is installed once even if several skills
+        depend on it. Skills depending on a failed install are skipped.
+
+        Once a skill is cloned the graph is extended with the dependencies
+        listed in its skill_requirements.txt and manifest.yml. The skill is
+        done when these are installed, if one fails it is removed again.
+
+        Arguments:
+            graph (OrderedDict): graph from _build_dependency_graph,
+                                 extended with the discovered dependencies
+            roots (list): names of the requested skills, the origin is
+                          only recorded for these
+            constraints (str): path of a pip constraints file
+            origin (str): origin of the install request
+            max_threads (int): number of concurrent installs
+        Returns:
+            (dict) exception of each skill that failed or was skipped
+        """
+        # Dependencies not done yet of the skills not done yet
+        waiting = {}
+        dependents = defaultdict(list)
+        installed = set()
+        errors = {}
+
+        def add_nodes(names):
+            for name in names:
+                if name not in waiting and not graph[name][0].is_local:
+                    waiting[name] = set()
+            for name in names:
+                if name in waiting:
+                    for dependency in graph[name][1]:
+                        wait_for(name, dependency)
+
+        def wait_for(name, dependency):
+            if name not in waiting:
+                return
+            if dependency in errors:
+                fail(name, SkillRequirementsException(
+                    'Could not install dependency ' + dependency
+                ))
+            elif dependency in waiting:
+                waiting[name].add(dependency)
+                dependents[dependency].append(name)
+
+        def done(name):
+            del waiting[name]
+            for dependent in dependents.pop(name, ()):
+                if dependent in waiting:
+                    waiting[dependent].discard(name)
+
+        def fail(name, error):
+            LOG.error('Error installing {}: {}'.format(name, repr(error)))
+            errors[name] = error
+            del waiting[name]
+            if name in installed:
+                self._remove_failed_install(graph[name][0], error)
+            for dependent in dependents.pop(name, ()):
+                if dependent in waiting:
+                    fail(dependent, SkillRequirementsException(
+                        'Could not install dependency ' + name
+                    ))
+
+        def extend(name):
+            """Add the dependencies the cloned skill lists on disk."""
+            skill, dependencies = graph[name]
+            try:
+                discovered = self._build_dependency_graph([skill])
+            except SkillRequirementsException as e:
+                fail(name, e)
+                return
+            new_names = [n for n in discovered if n not in graph]
+            for new_name in new_names:
+                graph[new_name] = discovered[new_name]
+            graph[name] = (skill, discovered[name][1])
+            cycle = _find_cycle({
+                n: deps for n, (_, deps) in graph.items()
+            })
+            if cycle:
+                fail(name, SkillRequirementsException(
+                    'Circular skill dependencies: ' + ' -> '.join(cycle)
+                ))
+                return
+            add_nodes(new_names)
+            for dependency in graph[name][1]:
+                wait_for(name, dependency)
+
+        add_nodes(list(graph))
+        running = {}
+        with ThreadPoolExecutor(max_threads) as executor:
+            while waiting or running:
+                ready = [n for n, deps in waiting.items()
+                         if not deps and n not in running.values()]
+                for name in ready:
+                    if name in installed:
+                        done(name)
+                        continue
+                    future = executor.submit(
+                        self._install_skill, graph[name][0], constraints,
+                        origin if name in roots else ''
+                    )
+                    running[future] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if isinstance(error, AlreadyInstalled):
+                        error = None
+                    if error:
+                        fail(name, error)
+                    elif name in waiting:
+                        installed.add(name)
+                        extend(name)
+        return errors
+
+    def _remove_failed_install(self, skill, error):
+        """Remove a skill installed before a dependency of it failed."""
+        LOG.info('Removing {}, its dependencies failed to '
+                 'install'.format(skill.name))
+        try:
+            skill.remove()
+        except MsmException as e:
+            LOG.warning('Could not remove {} ({})'.format(
+                skill.name, repr(e)
+            ))
+        skill_state = get_skill_state(skill.name, self.device_skill_state)
+        if skill_state:
+            skill_state.update(
+                installation='failed',
+                status='error',
+                failure_message=str(error)
+            )
+        self._update_skills_cache(skill)
+
+    @save_device_skill_state
+    def install_skill_requirements(self, skill, constraints=None):
+        """Install the skills an installed skill depends on.
+
+        The dependencies are installed from a dependency graph like in
+        install.
+
+        Arguments:
+            skill (SkillEntry): installed skill
+            constraints (str): path of a pip constraints file
+        Raises:
+            SkillRequirementsException: if a dependency couldn't be
+                                        installed or they are circular
+        """
+        graph = self._build_dependency_graph([skill])
+        errors = self._install_dependency_graph(graph, [], constraints)
+        if errors:
+            raise SkillRequirementsException(
+                'Could not install the dependencies of {}: {}'.format(
+                    skill.name, ', '.join(errors)
+                )
+            )
 
     @save_device_skill_state
     def remove(self, param, author=None):
@@ -432,13 +747,106 @@ class MycroftSkillsManager(object):
             LOG.exception('Failed to remove skill ' + skill.name)
             raise
         else:
-            remaining_skills = []
-            for skill_state in self.device_skill_state['skills']:
-                if skill_state['name'] != skill.name:
-                    remaining_skills.append(skill_state)
-            self.device_skill_state['skills'] = remaining_skills
+            skill_states = self.device_skill_state['skills']
+            skill_states.remove_entries(skill_states.find_all(skill.name))
+            self._update_skills_cache(skill)
+
+    def plan_updates(self, skills=None):
+        """Get the installed skills that may have updates.
+
+        Skills already at the sha pinned in the skills repo are left out,
+        finding them needs no network access.
+
+        Arguments:
+            skills (list): skills to check, defaults to all local skills
+        Returns:
+            (list) skills that need to be updated
+        """
+        if skills is None:
+            skills = self.local_skills.values()
+        return [skill for skill in skills if not skill.matches_pinned_sha()]
+
+    def check_updates(self, skills=None, max_threads=20):
+        """Find the installed skills that have updates.
+
+        Pinned skills are compared with the sha in the skills repo. The
+        remote HEAD of beta skills is listed concurrently, with at most
+        MAX_CHECKS_PER_HOST checks running against the same host.
+
+        Arguments:
+            skills (list): skills to check, defaults to all local skills
+            max_threads (int): number of concurrent checks
+        Returns:
+            (list) skills that need to be updated
+        """
+        planned = self.plan_updates(skills)
+        beta_skills = [skill for skill in planned if skill.is_beta]
+        hosts = [_url_host(skill.url) for skill in beta_skills]
+        host_limits = {
+            host: BoundedSemaphore(MAX_CHECKS_PER_HOST) for host in hosts
+        }
+
+        def check_skill(skill, host):
+            with host_limits[host]:
+                try:
+                    return skill.has_remote_changes()
+                except GitError as e:
+                    LOG.warning('Could not check {} for updates ({})'.format(
+                        skill.name, repr(e)
+                    ))
+                    return True
+
+        with ThreadPoolExecutor(max_threads) as executor:
+            moved = list(executor.map(check_skill, beta_skills, hosts))
+        unchanged = {
+            id(skill) for skill, has_changes in zip(beta_skills, moved)
+            if not has_changes
+        }
+        return [skill for skill in planned if id(skill) not in unchanged]
+
+    @contextmanager
+    def _batch_installs(self):
+        """Install the requirements of the skill actions at once."""
+        if self.pip_batch is not None or \
+                self.system_package_batch is not None:
+            yield  # Already batching
+            return
+        if self.batch_system_packages:
+            self.system_package_batch = SystemPackageBatch()
+        if self.batch_pip or self.batch_system_packages:
+            # Python packages may need the batched system packages to
+            # build, so they are deferred as well
+            self.pip_batch = PipBatch(self.wheelhouse,
+                                      combine=self.batch_pip)
+        try:
+            yield
+        finally:
+            system_package_batch = self.system_package_batch
+            pip_batch = self.pip_batch
+            self.system_package_batch = self.pip_batch = None
+            # System packages first, they may provide libraries needed
+            # to build python packages
+            failures = {}
+            if system_package_batch is not None:
+                failures = system_package_batch.run()
+                self._record_batch_failures(failures)
+            if pip_batch is not None:
+                self._record_batch_failures(pip_batch.run(skip=failures))
+
+    def _record_batch_failures(self, failures):
+        for skill, error in failures.items():
+            LOG.error('Failed to install requirements of {}: '
+                      '{}'.format(skill.name, repr(error)))
+            skill.is_local = path.exists(skill.path)
+            skill_state = get_skill_state(skill.name, self.device_skill_state)
+            if skill_state:
+                skill_state.update(status='error', failure_message=str(error))
+                if not skill.is_local:
+                    skill_state['installation'] = 'failed'
+        if failures:
             self._invalidate_skills_cache()
 
+    @save_device_skill_state
     def update_all(self):
         def update_skill(skill):
             entry = get_skill_state(skill.name, self.device_skill_state)
@@ -450,7 +858,15 @@ class MycroftSkillsManager(object):
                 if entry:
                     entry['updated'] = time.time()
 
-        return self.apply(update_skill, self.local_skills.values())
+        skills = list(self.local_skills.values())
+        planned = self.check_updates(skills)
+        for skill in skills:
+            if skill not in planned:
+                entry = get_skill_state(skill.name, self.device_skill_state)
+                if entry:
+                    entry['beta'] = skill.is_beta
+        with self._batch_installs():
+            return self.apply(update_skill, planned)
 
     @save_device_skill_state
     def update(self, skill=None, author=None):
@@ -492,18 +908,90 @@ class MycroftSkillsManager(object):
 
     @save_device_skill_state
     def install_defaults(self):
-        """Installs the default skills, updates all others"""
+        """Installs the default skills, updates all others
 
-        def install_or_update_skill(skill):
+        Returns:
+            (list) result of installing or updating each default skill,
+            False if it failed
+        """
+        skills = list(self.default_skills.values())
+        local_skills = [skill for skill in skills if skill.is_local]
+        graph = OrderedDict()
+        roots = set()
+        errors = {}
+        for skill in skills:
             if skill.is_local:
-                self.update(skill)
-            else:
-                self.install(skill, origin='default')
-
-        return self.apply(
-            install_or_update_skill,
-            self.default_skills.values()
-        )
+                continue
+            roots.add(skill.name)
+            try:
+                graph.update(self._build_dependency_graph([skill]))
+            except SkillRequirementsException as e:
+                LOG.error('Could not install {}: {}'.format(skill.name, e))
+                errors[skill.name] = e
+
+        with self._batch_installs():
+            errors.update(self._install_dependency_graph(graph, roots,
+                                                         origin='default'))
+            updates = dict(zip(
+                (skill.name for skill in local_skills),
+                self.apply(self.update, local_skills)
+            ))
+        return [
+            updates[skill.name] if skill.name in updates
+            else (False if skill.name in errors else None)
+            for skill in skills
+        ]
+
+    def build_wheels(self, catalog=False, constraints=None):
+        """Build wheels of the python requirements of skills.
+
+        The wheels are stored in the wheelhouse, from where skill installs
+        on this or other devices can use them without building anything.
+
+        Arguments:
+            catalog (bool): build the requirements of all skills in the
+                            skills repo instead of the installed skills
+            constraints (str): path of a pip constraints file
+        Returns:
+            (bool) False if the wheels of some requirements failed to build
+        """
+        if not self.wheelhouse:
+            raise MsmException('No wheelhouse configured')
+        if catalog:
+            requirements = [
+                (skill.meta_info.get('requirements') or {}).get('python')
+                for skill in self.all_skills
+            ]
+        else:
+            requirements = [
+                skill.dependent_python_packages
+                for skill in self.local_skills.values()
+            ]
+        packages = list(OrderedDict.fromkeys(
+            package for packages in requirements for package in packages or []
+        ))
+        if not packages:
+            return True
+        if not constraints and path.exists(DEFAULT_CONSTRAINTS):
+            constraints = DEFAULT_CONSTRAINTS
+
+        LOG.info('Building wheels of {} requirements'.format(len(packages)))
+        try:
+            build_wheels(packages, self.wheelhouse, constraints)
+            return True
+        except PipRequirementsException as e:
+            LOG.warning('Building all wheels at once failed ({}), building '
+                        'them one by one'.format(repr(e)))
+        success = True
+        for package in packages:
+            try:
+                build_wheels([package], self.wheelhouse, constraints)
+            except PipRequirementsException as e:
+                LOG.error('Could not build wheel of {}: {}'.format(
+                    package, repr(e)
+                ))
+                success = False
+        return success
 
     def _invalidate_skills_cache(self, new_value=None):
         """Reset the cached skill lists in case something changed.
@@ -518,35 +1006,96 @@ class MycroftSkillsManager(object):
         self._all_skills = None if new_value is None else new_value
         self._local_skills = None
         self._default_skills = None
+        self._find_skill_cache.clear()
+
+    def _update_skills_cache(self, skill):
+        """Update the cached skill lists after installing or removing skill.
+        """
+        all_skills = self._all_skills
+        if all_skills is not None:
+            all_skills.update_skill(skill)
+        self._local_skills = None
+        self._default_skills = None
 
     def find_skill(self, param, author=None, skills=None):
         # type: (str, str, List[SkillEntry]) -> SkillEntry
         """Find skill by name or url"""
         if param.startswith('https://') or param.startswith('http://'):
-            repo_id = SkillEntry.extract_repo_id(param)
-            for skill in self.all_skills:
-                if skill.id == repo_id:
-                    return skill
+            skill = self.all_skills.get_by_id(
+                SkillEntry.extract_repo_id(param)
+            ) or self.all_skills.get_by_url(param)
+            if skill:
+                return skill
             name = SkillEntry.extract_repo_name(param)
             skill_directory = SkillEntry.create_path(self.skills_dir, param)
             return SkillEntry(name, skill_directory, param, msm=self)
+        elif skills:
+            return self._best_match(param, dict(zip(
+                skills, SkillEntry.match_many(param, author, skills)
+            )))
         else:
-            skill_confs = {
-                skill: skill.match(param, author)
-                for skill in skills or self.all_skills
-            }
-            best_skill, score = max(skill_confs.items(), key=lambda x: x[1])
-            LOG.info('Best match ({}): {} by {}'.format(
-                round(score, 2), best_skill.name, best_skill.author)
+            index = self._get_search_index()
+            key = (param, author)
+            cached = self._find_skill_cache.get(key)
+            if cached is None:
+                # Skills scoring below the bounds of _best_match are left out
+                skill_confs = OrderedDict(index.match_all(
+                    param, author, min_score=0.3 * 0.7, relative=0.7
+                ))
+                try:
+                    cached = (self._best_match(param, skill_confs), None)
+                except (SkillNotFound, MultipleSkillMatches) as e:
+                    cached = (None, e)
+                self._find_skill_cache.put(key, cached)
+            skill, error = cached
+            if error:
+                raise copy(error)
+            return skill
+
+    @staticmethod
+    def _best_match(param, skill_confs):
+        if not skill_confs:
+            raise SkillNotFound(param)
+        best_skill, score = max(skill_confs.items(), key=lambda x: x[1])
+        LOG.info('Best match ({}): {} by {}'.format(
+            round(score, 2), best_skill.name, best_skill.author)
+        )
+        if score < 0.3:
+            raise SkillNotFound(param)
+        low_bound = (score * 0.7) if score != 1.0 else 1.0
+
+        close_skills = [
+            skill for skill, conf in skill_confs.items()
+            if conf >= low_bound and skill != best_skill
+        ]
+        if close_skills:
+            raise MultipleSkillMatches([best_skill] + close_skills)
+        return best_skill
+
+    def _get_search_index(self):
+        skills = self.all_skills
+        generation = getattr(skills, 'generation', None)
+        if self._search_index is None or \
+                self._search_index.skills is not skills or \
+                self._search_index_generation != generation:
+            self._search_index = SkillSearchIndex(skills)
+            self._search_index_generation = generation
+            self._find_skill_cache.clear()
+        return self._search_index
+
+    def search(self, query, author=None, min_score=0.3):
+        """Find the skills matching a name.
+
+        Arguments:
+            query (str): name to search for
+            author (str): author to search for
+            min_score (float): lowest score of SkillEntry.match() included
+        Returns:
+            (list) matching skills in the order of all_skills
+        """
+        return [
+            skill for skill, score in self._get_search_index().match_all(
+                query, author, min_score=min_score
             )
-            if score < 0.3:
-                raise SkillNotFound(param)
-            low_bound = (score * 0.7) if score != 1.0 else 1.0
-
-            close_skills = [
-                skill for skill, conf in skill_confs.items()
-                if conf >= low_bound and skill != best_skill
-            ]
-            if close_skills:
-                raise MultipleSkillMatches([best_skill] + close_skills)
-            return best_skill
+            if score >= min_score
+        ]
@@ -0,0 +1,349 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Installation of the python requirements of skills with pip."""
+import hashlib
+import logging
+import os
+import shutil
+import sys
+from collections import OrderedDict
+from subprocess import PIPE, Popen
+from threading import Lock
+
+from packaging.markers import UndefinedEnvironmentName
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # Python < 3.8
+    import importlib_metadata
+
+from msm.exceptions import PipRequirementsException
+
+LOG = logging.getLogger(__name__)
+
+# Only one pip process may modify the environment at a time
+pip_lock = Lock()
+
+_environment_lock = Lock()
+_installed_versions = (None, {})
+_missing_cache = {}
+
+
+def _environment_fingerprint():
+    """Identify the state of the installed packages.
+
+    Installing or removing a package modifies the folder it is installed
+    in, changing the modification times of the import path.
+    """
+    fingerprint = []
+    for entry in sys.path:
+        try:
+            fingerprint.append((entry, os.stat(entry or '.').st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(fingerprint)
+
+
+def _get_installed_versions(fingerprint):
+    global _installed_versions
+    if _installed_versions[0] != fingerprint:
+        versions = {}
+        for dist in importlib_metadata.distributions():
+            name = dist.metadata['Name']
+            if name:
+                # The first distribution on the path shadows the others
+                versions.setdefault(canonicalize_name(name), dist.version)
+        _installed_versions = (fingerprint, versions)
+    return _installed_versions[1]
+
+
+def _parse_constraints(content):
+    """Get the requirements of a constraints file by package name.
+
+    Returns:
+        (dict) requirements by name or None if the file contains lines
+        that can't be checked without pip
+    """
+    by_name = {}
+    for line in content.splitlines():
+        line = line.split(' #')[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            return None
+        name = canonicalize_name(requirement.name)
+        by_name.setdefault(name, []).append(requirement)
+    return by_name
+
+
+def _is_satisfied(requirement, constraints, installed):
+    try:
+        requirement = Requirement(requirement)
+    except InvalidRequirement:
+        return False  # Urls, editable installs and pip options
+    if requirement.url or requirement.extras:
+        return False
+    try:
+        if requirement.marker and not requirement.marker.evaluate():
+            return True  # Not needed on this platform
+    except UndefinedEnvironmentName:
+        return False
+    name = canonicalize_name(requirement.name)
+    version = installed.get(name)
+    if version is None:
+        return False
+    for req in [requirement] + constraints.get(name, []):
+        if req.marker and req is not requirement and \
+                not req.marker.evaluate():
+            continue
+        if not req.specifier.contains(version, prereleases=True):
+            return False
+    return True
+
+
+def _pip_in_interpreter_dir():
+    """Check if pip belongs to the running interpreter.
+
+    The check only makes sense if pip installs into the environment this
+    process imports from.
+    """
+    pip = shutil.which('pip')
+    return bool(pip) and os.path.samefile(os.path.dirname(pip),
+                                          os.path.dirname(sys.executable))
+
+
+def missing_requirements(packages, constraints=None):
+    """Get the requirements that aren't satisfied by installed packages.
+
+    Checks the installed distributions without starting pip. Requirements
+    that can't be checked this way, like urls, are always returned. The
+    result is cached until the installed packages change.
+
+    Arguments:
+        packages (list): requirement specifiers
+        constraints (str): path of a pip constraints file
+    Returns:
+        (list) requirements that need to be installed with pip
+    """
+    if not _pip_in_interpreter_dir():
+        return list(packages)
+
+    constraints_content = b''
+    if constraints:
+        try:
+            with open(constraints, 'rb') as f:
+                constraints_content = f.read()
+        except OSError:
+            return list(packages)
+
+    key = hashlib.sha1(
+        '\n'.join(packages).encode() + b'\0' + constraints_content
+    ).hexdigest()
+    with _environment_lock:
+        fingerprint = _environment_fingerprint()
+        cached = _missing_cache.get(key)
+        if cached and cached[0] == fingerprint:
+            return list(cached[1])
+
+        constraint_reqs = _parse_constraints(constraints_content.decode())
+        if constraint_reqs is None:
+            return list(packages)
+        installed = _get_installed_versions(fingerprint)
+        missing = [
+            package for package in packages
+            if not _is_satisfied(package, constraint_reqs, installed)
+        ]
+        _missing_cache[key] = (fingerprint, missing)
+        return list(missing)
+
+
+def _run_pip(args, packages, constraints=None):
+    pip_args = ['pip'] + args
+    if constraints:
+        pip_args += ['-c', constraints]
+
+    proc = Popen(pip_args + list(packages), stdout=PIPE, stderr=PIPE)
+    stdout, stderr = proc.communicate()
+    pip_code = proc.returncode
+    if pip_code != 0:
+        stderr = stderr.decode()
+        if pip_code == 1 and 'sudo:' in stderr and pip_args[0] == 'sudo':
+            raise PipRequirementsException(
+                2, '', 'Permission denied while installing pip '
+                       'dependencies. Please run in virtualenv or use sudo'
+            )
+        raise PipRequirementsException(pip_code, stdout.decode(), stderr)
+
+
+def build_wheels(packages, wheelhouse, constraints=None):
+    """Build wheels of python packages and their dependencies.
+
+    Wheels already in the wheelhouse are reused.
+
+    Arguments:
+        packages (list): requirement specifiers to build
+        wheelhouse (str): folder to store the wheels in
+        constraints (str): path of a pip constraints file
+    Raises:
+        PipRequirementsException: if pip failed
+    """
+    os.makedirs(wheelhouse, exist_ok=True)
+    _run_pip(['wheel', '--wheel-dir', wheelhouse, '--find-links', wheelhouse],
+             packages, constraints)
+
+
+def pip_install(packages, constraints=None, wheelhouse=None):
+    """Install python packages with a single pip run.
+
+    With a wheelhouse, the packages are installed from its wheels without
+    accessing the package index if possible. Otherwise the missing wheels
+    are built into the wheelhouse first.
+
+    Arguments:
+        packages (list): requirement specifiers to install
+        constraints (str): path of a pip constraints file
+        wheelhouse (str): folder with wheels to install from
+    Raises:
+        PipRequirementsException: if pip failed
+    """
+    if not wheelhouse:
+        _run_pip(['install'], packages, constraints)
+        return
+
+    find_links = ['--find-links', wheelhouse]
+    try:
+        _run_pip(['install', '--no-index'] + find_links, packages,
+                 constraints)
+        return
+    except PipRequirementsException:
+        LOG.info('Requirements missing from the wheelhouse, building wheels')
+    try:
+        build_wheels(packages, wheelhouse, constraints)
+    except PipRequirementsException as e:
+        LOG.warning('Could not build wheels ({})'.format(repr(e)))
+        _run_pip(['install'] + find_links, packages, constraints)
+    else:
+        _run_pip(['install', '--no-index'] + find_links, packages,
+                 constraints)
+
+
+def pip_install_in_order(packages, constraints=None, wheelhouse=None):
+    """Install python packages one by one in the given order."""
+    for package in packages:
+        pip_install([package], constraints, wheelhouse)
+
+
+class PipBatch(object):
+    """Python requirements of several skills, installed together.
+
+    Requirements are installed with one pip run per constraints file. If
+    that fails, the requirements of each skill are installed in order to
+    find the skills whose requirements can't be installed.
+
+    Arguments:
+        wheelhouse (str): folder with wheels to install from
+        combine (bool): install the requirements of all skills in one pip
+                        run, otherwise they are only deferred and then
+                        installed skill by skill
+    """
+
+    def __init__(self, wheelhouse=None, combine=True):
+        self.wheelhouse = wheelhouse
+        self.combine = combine
+        self._lock = Lock()
+        self._requests = []
+
+    def add(self, skill, packages, constraints=None, rollback=None):
+        """Queue the requirements of a skill.
+
+        Arguments:
+            skill (SkillEntry): skill needing the packages
+            packages (list): requirement specifiers in install order
+            constraints (str): path of a pip constraints file
+            rollback (callable): undoes the skill action if the
+                                 requirements can't be installed
+        """
+        with self._lock:
+            self._requests.append((skill, list(packages), constraints,
+                                   rollback))
+
+    def __len__(self):
+        return len(self._requests)
+
+    def run(self, skip=()):
+        """Install all queued requirements.
+
+        Skills whose requirements failed are rolled back.
+
+        Arguments:
+            skip (iterable): skills whose requirements are left out, like
+                             skills that already failed
+        Returns:
+            (dict) PipRequirementsException of each failed skill
+        """
+        with self._lock:
+            requests, self._requests = self._requests, []
+        skip = set(skip)
+        requests = [request for request in requests
+                    if request[0] not in skip]
+
+        groups = OrderedDict()
+        for request in requests:
+            groups.setdefault(request[2], []).append(request)
+
+        failures = {}
+        for constraints, group in groups.items():
+            packages = list(OrderedDict.fromkeys(
+                package for request in group for package in request[1]
+            ))
+            LOG.info('Installing python requirements of {} skills'.format(
+                len(group)
+            ))
+            with pip_lock:
+                if self.combine:
+                    try:
+                        pip_install(packages, constraints, self.wheelhouse)
+                        continue
+                    except PipRequirementsException as e:
+                        LOG.warning('Batched pip install failed ({}), '
+                                    'installing requirements per '
+                                    'skill'.format(repr(e)))
+
+                for skill, packages, _, rollback in group:
+                    try:
+                        pip_install_in_order(packages, constraints,
+                                             self.wheelhouse)
+                    except PipRequirementsException as e:
+                        failures[skill] = e
+
+        for skill, _, _, rollback in requests:
+            if skill in failures and rollback:
+                LOG.info('Rolling back ' + skill.name)
+                try:
+                    rollback()
+                except Exception:
+                    LOG.exception('Could not roll back ' + skill.name)
+        return failures
@@ -0,0 +1,168 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""List of skill entries with indexes for looking up skills."""
+from collections import defaultdict
+from threading import RLock
+
+
+def normalize_url(url):
+    """Normalize a skill url the way SkillEntry does."""
+    url = url.rstrip('/')
+    return url[:-len('.git')] if url.endswith('.git') else url
+
+
+class SkillCollection(list):
+    """Skill entries indexed by id, name, path and url.
+
+    The indexes are kept up to date by add, discard and refresh, changing
+    the list in other ways bypasses them. These may be called from several
+    threads. Every change increments the generation, allowing data derived
+    from the skills to be recomputed when it changed.
+
+    Arguments:
+        skills (list): skill entries
+        remote_ids (iterable): ids of the skills in the skills repo
+    """
+
+    def __init__(self, skills=(), remote_ids=()):
+        super(SkillCollection, self).__init__(skills)
+        self.remote_ids = set(remote_ids)
+        self.generation = 0
+        self._lock = RLock()
+        self._keys = {}
+        self._by_id = defaultdict(list)
+        self._by_name = defaultdict(list)
+        self._by_path = defaultdict(list)
+        self._by_url = defaultdict(list)
+        self._local_by_name = defaultdict(list)
+        self._local_by_path = defaultdict(list)
+        self._local_skills = {}
+        for skill in self:
+            self._index(skill)
+
+    def _index_entries(self, keys, local):
+        skill_id, name, path, url = keys
+        entries = [(self._by_id, skill_id), (self._by_name, name),
+                   (self._by_path, path), (self._by_url, url)]
+        if local:
+            entries += [(self._local_by_name, name),
+                        (self._local_by_path, path)]
+        return entries
+
+    def _index(self, skill):
+        keys = (skill.id, skill.name, skill.path, skill.url)
+        local = bool(skill.is_local)
+        self._keys[id(skill)] = (keys, local)
+        for index, key in self._index_entries(keys, local):
+            index[key].append(skill)
+        if local:
+            self._local_skills[skill.name] = skill
+
+    def _unindex(self, skill):
+        keys, local = self._keys.pop(id(skill))
+        for index, key in self._index_entries(keys, local):
+            index[key].remove(skill)
+            if not index[key]:
+                del index[key]
+        if local:
+            # The last installed skill with the name takes its place
+            name = keys[1]
+            if name in self._local_by_name:
+                self._local_skills[name] = self._local_by_name[name][-1]
+            else:
+                del self._local_skills[name]
+
+    def __contains__(self, skill):
+        return id(skill) in self._keys
+
+    @property
+    def local_skills(self):
+        """Copy of the installed skills keyed by name."""
+        with self._lock:
+            return dict(self._local_skills)
+
+    def add(self, skill):
+        """Append a skill entry to the collection."""
+        with self._lock:
+            self.append(skill)
+            self._index(skill)
+            self.generation += 1
+
+    def discard(self, skill):
+        """Remove a skill entry from the collection if present."""
+        with self._lock:
+            if skill in self:
+                self._unindex(skill)
+                self[:] = [s for s in self if s is not skill]
+                self.generation += 1
+
+    def refresh(self, skill):
+        """Update the indexes after a skill entry was modified.
+
+        Called after installing or removing a skill, changing is_local.
+        """
+        with self._lock:
+            self._unindex(skill)
+            self._index(skill)
+            self.generation += 1
+
+    def update_skill(self, skill):
+        """Add, refresh or drop a skill after installing or removing it.
+
+        Skills that aren't in the skills repo are dropped once removed, as
+        when listing the skills again.
+        """
+        with self._lock:
+            if skill in self:
+                if skill.is_local or skill.id in self.remote_ids:
+                    self.refresh(skill)
+                else:
+                    self.discard(skill)
+            elif skill.is_local:
+                self.add(skill)
+
+    def _get(self, index, key, position):
+        with self._lock:
+            skills = index.get(key)
+            return skills[position] if skills else None
+
+    def get_by_id(self, skill_id):
+        """Get the first skill with an id or None."""
+        return self._get(self._by_id, skill_id, 0)
+
+    def get_by_name(self, name):
+        """Get the last skill with a name or None."""
+        return self._get(self._by_name, name, -1)
+
+    def get_by_path(self, path, local=False):
+        """Get the last skill at a path or None.
+
+        Arguments:
+            path (str): folder of the skill
+            local (bool): only consider installed skills
+        """
+        return self._get(self._local_by_path if local else self._by_path,
+                         path, -1)
+
+    def get_by_url(self, url):
+        """Get the first skill with a url, compared after normalizing."""
+        return self._get(self._by_url, normalize_url(url), 0)
@@ -20,6 +20,7 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import heapq
 import logging
 import os
 import shutil
@@ -27,23 +28,24 @@ import subprocess
 import yaml
 from contextlib import contextmanager
 from difflib import SequenceMatcher
-from functools import wraps
+from functools import partial, wraps
 from git import Repo, GitError
 from git.exc import GitCommandError
 from lazy import lazy
-from os.path import exists, join, basename, isfile
+from os.path import exists, join, basename, dirname, isfile
 from shutil import rmtree, move
-from subprocess import PIPE, Popen
-from tempfile import mktemp, gettempdir
-from threading import Lock
+from tempfile import mkdtemp, mktemp
 from typing import Callable
 from pako import PakoManager
 
 from msm import SkillRequirementsException, git_to_msm_exceptions
-from msm.exceptions import PipRequirementsException, \
-    SystemRequirementsException, AlreadyInstalled, SkillModified, \
-    AlreadyRemoved, RemoveException, CloneException, NotInstalled, GitException
-from msm.util import cached_property, Git
+from msm.exceptions import SystemRequirementsException, AlreadyInstalled, \
+    SkillModified, AlreadyRemoved, RemoveException, CloneException, \
+    NotInstalled, GitException
+from msm.pip_batch import missing_requirements, pip_install_in_order, \
+    pip_lock
+from msm.util import cached_property, find_git_dir, get_git_sha, \
+    is_shallow_clone, read_git_ref, read_git_remote_url, Git
 
 LOG = logging.getLogger(__name__)
 
@@ -53,6 +55,8 @@ SWITCHABLE_BRANCHES = ['master']
 
 # default constraints to use if no are given
 DEFAULT_CONSTRAINTS = '/etc/mycroft/constraints.txt'
+# Words common in skill names, matched separately from the rest of the name
+MATCH_COMMON_TOKENS = ['skill', 'fallback', 'mycroft']
 FIVE_MINUTES = 300
 
 
@@ -75,6 +79,12 @@ def _perform_pako_install(packages, system_packages=None):
     return success
 
 
+def _deepen(git):
+    """Fetch the full history of all branches into a shallow clone."""
+    git.config('remote.origin.fetch', '+refs/heads/*:refs/remotes/origin/*')
+    git.fetch('origin', unshallow=True)
+
+
 @contextmanager
 def work_dir(directory):
     old_dir = os.getcwd()
@@ -85,42 +95,154 @@ def work_dir(directory):
         os.chdir(old_dir)
 
 
+def _git_snapshot(path):
+    """Record the commit and branch checked out at path.
+
+    Checkouts with local changes get no snapshot, restoring it would
+    discard the changes.
+
+    Returns:
+        (tuple) sha and branch name (None if detached) or None if path
+        isn't a clean git checkout
+    """
+    git_dirs = find_git_dir(path)
+    sha = read_git_ref(path)
+    if not git_dirs or not sha:
+        return None
+    try:
+        if Git(path).status(porcelain=True, untracked='no'):
+            return None
+    except GitError:
+        return None
+    with open(join(git_dirs[0], 'HEAD')) as f:
+        head = f.read().strip()
+    prefix = 'ref: refs/heads/'
+    branch = head[len(prefix):] if head.startswith(prefix) else None
+    return sha, branch
+
+
+def _restore_git_snapshot(path, snapshot):
+    sha, branch = snapshot
+    if branch:
+        Git(path).checkout('-B', branch, sha, force=True)
+    else:
+        Git(path).checkout(sha, force=True)
+
+
+def _backup_copy(path):
+    """Copy the files at path into a new temporary folder.
+
+    The copy shares the data blocks with the original on filesystems
+    supporting reflinks.
+    """
+    backup = join(mkdtemp(prefix='msm-backup-'), basename(path))
+    try:
+        subprocess.check_call(['cp', '-a', '--reflink=auto', path, backup],
+                              stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        rmtree(backup, ignore_errors=True)
+        shutil.copytree(path, backup, symlinks=True)
+    return backup
+
+
 def _backup_previous_version(func: Callable = None):
-    """Private decorator to back up previous skill folder"""
+    """Private decorator to back up previous skill folder.
+
+    Git checkouts are rolled back to the previously checked out commit,
+    other folders are restored from a copy.
+    """
 
     @wraps(func)
     def wrapper(self, *args, **kwargs):
         self.old_path = None
+        snapshot = None
         if self.is_local:
-            self.old_path = join(gettempdir(), self.name)
-            if exists(self.old_path):
-                rmtree(self.old_path)
-            shutil.copytree(self.path, self.old_path)
+            snapshot = _git_snapshot(self.path)
+            if not snapshot:
+                self.old_path = _backup_copy(self.path)
+        # Undoes the action after it completed, used by batched pip installs
+        if snapshot:
+            self.rollback = partial(_restore_git_snapshot, self.path,
+                                    snapshot)
+        elif not self.is_local:
+            self.rollback = partial(rmtree, self.path, ignore_errors=True)
         try:
-            func(self, *args, **kwargs)
+            return func(self, *args, **kwargs)
 
-        # Modified skill or GitError should not restore working copy
-        except (SkillModified, GitError, GitException):
+        # Modified skill, GitError or an untouched installed skill should
+        # not restore working copy
+        except (SkillModified, GitError, GitException, AlreadyInstalled):
             raise
         except Exception:
             LOG.info('Problem performing action. Restoring skill to '
                      'previous state...')
-            if exists(self.path):
-                rmtree(self.path)
-            if self.old_path and exists(self.old_path):
-                shutil.copytree(self.old_path, self.path)
+            if snapshot:
+                try:
+                    _restore_git_snapshot(self.path, snapshot)
+                except GitError as e:
+                    LOG.warning('Could not restore {} ({})'.format(
+                        self.name, repr(e)
+                    ))
+            else:
+                if exists(self.path):
+                    rmtree(self.path)
+                if self.old_path and exists(self.old_path):
+                    move(self.old_path, self.path)
             self.is_local = exists(self.path)
             raise
         finally:
+            self.rollback = None
             # Remove temporary path if needed
-            if self.old_path and exists(self.old_path):
-                rmtree(self.old_path)
+            if self.old_path:
+                rmtree(dirname(self.old_path), ignore_errors=True)
 
     return wrapper
 
 
+def _exact_ratio(matcher):
+    return matcher.ratio()
+
+
+class _MatchScorer(object):
+    """Scores skill names against one query for SkillEntry.match.
+
+    The query is the second sequence of each matcher, SequenceMatcher
+    caches what it computes about it between skills.
+    """
+
+    def __init__(self, query, author=None):
+        search, search_tokens, search_common = SkillEntry._extract_tokens(
+            query, MATCH_COMMON_TOKENS
+        )
+        self._matchers = [
+            SequenceMatcher(b=search),
+            SequenceMatcher(b=search_tokens),
+            SequenceMatcher(b=search_common)
+        ]
+        self._author_matcher = SequenceMatcher(b=author) if author else None
+
+    def score(self, match_tokens, skill_author, ratio=_exact_ratio):
+        """Score a skill from its match_tokens.
+
+        Arguments:
+            ratio (callable): gets the ratio of a SequenceMatcher, an upper
+                              bound like quick_ratio gives an upper bound
+                              of the score
+        """
+        name, _, name_common = match_tokens
+        ratios = []
+        for matcher, seq in zip(self._matchers,
+                                [name, name.split(' '), name_common]):
+            matcher.set_seq1(seq)
+            ratios.append(ratio(matcher))
+        if self._author_matcher:
+            self._author_matcher.set_seq1(skill_author)
+            ratios.append(ratio(self._author_matcher))
+        return SkillEntry._combine_match_ratios(*ratios)
+
+
 class SkillEntry(object):
-    pip_lock = Lock()
+    pip_lock = pip_lock
     manifest_yml_format = {
         'dependencies': {
             'system': {},
@@ -137,17 +259,11 @@ class SkillEntry(object):
         self.url = url
         self.sha = sha
         self.msm = msm
-        if msm:
-            u = url.lower()
-            self.meta_info = msm.repo.skills_meta_info.get(u, {})
-        else:
-            self.meta_info = {}
+        self._meta_info = None
         if name is not None:
             self.name = name
-        elif 'name' in self.meta_info:
-            self.name = self.meta_info['name']
         else:
-            self.name = basename(path)
+            self.name = self.meta_info.get('name', basename(path))
 
         # TODO: Handle git:// urls as well
         from_github = False
@@ -158,11 +274,21 @@ class SkillEntry(object):
         self.id = self.extract_repo_id(url) if from_github else self.name
         self.is_local = exists(path)
         self.old_path = None  # Path of previous version while upgrading
+        self.rollback = None  # Undoes the running install or update
 
     @property
     def is_beta(self):
         return not self.sha or self.sha == 'HEAD'
 
+    def matches_pinned_sha(self):
+        """Check if the sha pinned in the skills repo is checked out.
+
+        Only reads the git refs of the skill, no git process or network
+        access is needed.
+        """
+        return (self.is_local and not self.is_beta and
+                read_git_ref(self.path) == self.sha)
+
     @property
     def is_dirty(self):
         """True if different from the version in the mycroft-skills repo.
@@ -173,19 +299,45 @@ class SkillEntry(object):
         - the skill is not a git repo
         - has local modifications
         """
+        return self.check_dirty(self.msm.repo.get_skill_shas())
+
+    def check_dirty(self, skill_shas):
+        """Check if the skill differs from the sha pinned for it.
+
+        Arguments:
+            skill_shas (dict): skill name to sha pinned in the catalog as
+                               returned by SkillRepo.get_skill_shas()
+        Returns:
+            (bool) True if the skill is dirty, see is_dirty
+        """
         if not exists(self.path):
             return False
         try:
+            current_sha = get_git_sha(self.path)
+            if (self.name not in skill_shas or
+                    current_sha != skill_shas[self.name]):
+                return True
             checkout = Git(self.path)
-            mod = checkout.status(porcelain=True, untracked_files='no') != ''
-            current_sha = checkout.rev_parse('HEAD')
+            return checkout.status(porcelain=True, untracked_files='no') != ''
         except GitCommandError:  # Not a git checkout
             return True
 
-        skill_shas = {d[0]: d[3] for d in self.msm.repo.get_skill_data()}
-        return (self.name not in skill_shas or
-                current_sha != skill_shas[self.name] or
-                mod)
+    @property
+    def meta_info(self):
+        """Skills repo meta-data of the skill.
+
+        Looked up in the skills repo on every access instead of being kept
+        by each entry, so only the meta-data of the skills in use is read.
+        """
+        if self._meta_info is not None:
+            return self._meta_info
+        if self.msm:
+            return self.msm.repo.skills_meta_info.get(self.url.lower(), {})
+        return {}
+
+    @meta_info.setter
+    def meta_info(self, value):
+        self._meta_info = value
 
     @cached_property(ttl=FIVE_MINUTES)
     def skill_gid(self):
@@ -200,8 +352,9 @@ class SkillEntry(object):
         gid = ''
         if self.is_dirty:
             gid += '@|'
-        if self.meta_info != {}:
-            gid += self.meta_info['skill_gid']
+        meta_info = self.meta_info
+        if meta_info != {}:
+            gid += meta_info['skill_gid']
         else:
             name = self.name.split('.')[0]
             gid += name
@@ -229,9 +382,9 @@ class SkillEntry(object):
             use_cache:  Enable/Disable cache usage. defaults to True
         """
         if msm and use_cache:
-            skills = {skill.path: skill for skill in msm.local_skills.values()}
-            if path in skills:
-                return skills[path]
+            skill = msm.all_skills.get_by_path(path, local=True)
+            if skill:
+                return skill
         return cls(None, path, cls.find_git_url(path), msm=msm)
 
     @classmethod
@@ -276,24 +429,17 @@ class SkillEntry(object):
     def _compare(cls, a, b):
         return SequenceMatcher(a=a, b=b).ratio()
 
-    def match(self, query, author=None):
-        search, search_tokens, search_common = self._extract_tokens(
-            query, ['skill', 'fallback', 'mycroft']
-        )
-
-        name, name_tokens, name_common = self._extract_tokens(
-            self.name, ['skill', 'fallback', 'mycroft']
-        )
-
+    @staticmethod
+    def _combine_match_ratios(name_ratio, tokens_ratio, common_ratio,
+                              author_ratio=None):
         weights = [
-            (9, self._compare(name, search)),
-            (9, self._compare(name.split(' '), search_tokens)),
-            (2, self._compare(name_common, search_common)),
+            (9, name_ratio),
+            (9, tokens_ratio),
+            (2, common_ratio),
         ]
-        if author:
-            author_weight = self._compare(self.author, author)
+        if author_ratio is not None:
+            author_weight = author_ratio
             weights.append((5, author_weight))
-            author_weight = author_weight
         else:
             author_weight = 1.0
         return author_weight * (
@@ -301,6 +447,48 @@ class SkillEntry(object):
             sum(weight for weight, val in weights)
         )
 
+    @property
+    def match_tokens(self):
+        """Name, name tokens and common words of the name used by match.
+
+        Computed once per name instead of on every query.
+        """
+        cached = getattr(self, '_match_tokens', None)
+        if cached is None or cached[0] != self.name:
+            cached = (self.name, self._extract_tokens(self.name,
+                                                      MATCH_COMMON_TOKENS))
+            self._match_tokens = cached
+        return cached[1]
+
+    def match(self, query, author=None):
+        return self.match_many(query, author, [self])[0]
+
+    @classmethod
+    def match_many(cls, query, author, skills):
+        """Score several skills against one query.
+
+        Arguments:
+            query (str): name to search for
+            author (str): author to search for
+            skills (list): skills to score
+        Returns:
+            (list) score of each skill like match()
+        """
+        scorer = _MatchScorer(query, author)
+        return [scorer.score(skill.match_tokens, skill.author)
+                for skill in skills]
+
+    @classmethod
+    def match_top(cls, query, author, skills, count):
+        """Find the best scoring skills for a query.
+
+        Returns:
+            (list) up to count skill and score tuples, best first
+        """
+        scores = cls.match_many(query, author, skills)
+        return heapq.nlargest(count, zip(skills, scores),
+                              key=lambda item: item[1])
+
     def run_pip(self, constraints=None):
         if not self.dependent_python_packages:
             return False
@@ -312,32 +500,23 @@ class SkillEntry(object):
         elif exists(DEFAULT_CONSTRAINTS):
             constraints = DEFAULT_CONSTRAINTS
 
-        LOG.info('Installing requirements.txt for ' + self.name)
-        pip_args = ['pip', 'install']
+        packages = missing_requirements(self.dependent_python_packages,
+                                        constraints)
+        if not packages:
+            LOG.info('Requirements of {} already satisfied'.format(self.name))
+            return True
 
-        if constraints:
-            pip_args += ['-c', constraints]
+        pip_batch = getattr(self.msm, 'pip_batch', None)
+        if pip_batch is not None:
+            pip_batch.add(self, packages, constraints, self.rollback)
+            return True
 
+        LOG.info('Installing requirements.txt for ' + self.name)
         with self.pip_lock:
-            """
-            Iterate over the individual Python packages and
-            install them one by one to enforce the order specified
-            in the manifest.
-            """
-            for dependent_python_package in self.dependent_python_packages:
-                pip_command = pip_args + [dependent_python_package]
-                proc = Popen(pip_command, stdout=PIPE, stderr=PIPE)
-                pip_code = proc.wait()
-                if pip_code != 0:
-                    stderr = proc.stderr.read().decode()
-                    if pip_code == 1 and 'sudo:' in stderr and pip_args[0] == 'sudo':
-                        raise PipRequirementsException(
-                            2, '', 'Permission denied while installing pip '
-                                   'dependencies. Please run in virtualenv or use sudo'
-                        )
-                    raise PipRequirementsException(
-                        pip_code, proc.stdout.read().decode(), stderr
-                    )
+            # Install the packages one by one to enforce the order
+            # specified in the manifest.
+            pip_install_in_order(packages, constraints,
+                                 getattr(self.msm, 'wheelhouse', None))
 
         return True
 
@@ -347,17 +526,20 @@ class SkillEntry(object):
             exe: (packages or '').split()
             for exe, packages in self.dependent_system_packages.items()
         }
-        LOG.info('Installing system requirements...')
         packages = system_packages.pop('all', [])
+        exes = self.dependencies.get('exes') or []
+        batch = getattr(self.msm, 'system_package_batch', None)
+        if batch is not None:
+            batch.add(self, packages, system_packages, exes, self.rollback)
+            return True
+
+        LOG.info('Installing system requirements...')
         if packages:  # Only try to install if there are packages to install
             success = _perform_pako_install(packages, system_packages)
         else:
             success = True  # No packages to install
 
-        missing_exes = [
-            exe for exe in self.dependencies.get('exes') or []
-            if not shutil.which(exe)
-        ]
+        missing_exes = [exe for exe in exes if not shutil.which(exe)]
         # If executables are missing on the system inform of the issue.
         if missing_exes:
             # Pako was used and apparently failed.
@@ -389,12 +571,9 @@ class SkillEntry(object):
         if not self.msm:
             raise ValueError('Pass msm to SkillEntry to install skill deps')
         try:
-            for skill_dep in self.dependent_skills:
-                LOG.info("Installing skill dependency: {}".format(skill_dep))
-                try:
-                    self.msm.install(skill_dep)
-                except AlreadyInstalled:
-                    pass
+            self.msm.install_skill_requirements(self)
+        except SkillRequirementsException:
+            raise
         except Exception as e:
             raise SkillRequirementsException(e)
 
@@ -472,15 +651,50 @@ class SkillEntry(object):
 
         LOG.info('Successfully removed ' + self.name)
 
-    @_backup_previous_version
-    def install(self, constraints=None):
+    def _clone(self, location):
+        """Clone the skill, through the mirror cache of msm if available."""
+        mirror_cache = getattr(self.msm, 'mirror_cache', None)
+        if mirror_cache:
+            with mirror_cache.use(self.url) as mirror:
+                if mirror:
+                    Repo.clone_from(mirror, location)
+                    Git(location).remote('set-url', 'origin', self.url)
+                    return
+        if getattr(self.msm, 'shallow_installs', False):
+            self._shallow_clone(location)
+        else:
+            Repo.clone_from(self.url, location)
+
+    def _shallow_clone(self, location):
+        """Clone only the commit the skill is pinned to."""
+        Repo.clone_from(self.url, location, depth=1)
+        if self.is_beta or get_git_sha(location) == self.sha:
+            return
+        git = Git(location)
+        try:
+            git.fetch('origin', self.sha, depth=1)
+        except GitCommandError:
+            # The server doesn't allow fetching commits by sha
+            _deepen(git)
+
+    def install(self, constraints=None, skill_requirements=True):
+        """Clone the skill and install its requirements.
+
+        Arguments:
+            constraints (str): path of a pip constraints file
+            skill_requirements (bool): also install the skills it depends
+                                       on, off when msm schedules them
+        """
         if self.is_local:
             raise AlreadyInstalled(self.name)
+        return self._install(constraints, skill_requirements)
 
+    @_backup_previous_version
+    def _install(self, constraints, skill_requirements):
         LOG.info("Downloading skill: " + self.url)
         try:
             tmp_location = mktemp()
-            Repo.clone_from(self.url, tmp_location)
+            self._clone(tmp_location)
             self.is_local = True
             Git(tmp_location).reset(self.sha or 'HEAD', hard=True)
         except GitCommandError as e:
@@ -493,7 +707,7 @@ class SkillEntry(object):
         try:
             move(tmp_location, self.path)
 
-            if self.msm:
+            if self.msm and skill_requirements:
                 self.run_skill_requirements()
             self.install_system_deps()
             self.run_pip(constraints)
@@ -521,28 +735,61 @@ class SkillEntry(object):
             sha_branch = sha_branch.replace(remote + '/', '')
         return sha_branch
 
-    @_backup_previous_version
+    def _merge_remote(self, git):
+        current_branch = git.rev_parse('--abbrev-ref', 'HEAD').strip()
+        if self.sha and current_branch in SWITCHABLE_BRANCHES:
+            # Check out correct branch
+            git.checkout(self._find_sha_branch())
+
+        git.merge(self.sha or 'origin/HEAD', ff_only=True)
+
+    def has_remote_changes(self):
+        """Check if the HEAD of the remote repo moved since the last fetch.
+
+        Only lists the remote HEAD, nothing is fetched.
+
+        Returns:
+            (bool) True if fetching and merging could update the skill
+        Raises:
+            GitError: if the remote couldn't be queried
+        """
+        local_head = read_git_ref(self.path, 'refs/remotes/origin/HEAD')
+        if not local_head or read_git_ref(self.path) != local_head:
+            return True
+        output = Git(self.path).ls_remote('origin', 'HEAD')
+        return not output or output.split()[0] != local_head
+
     def update(self):
         if not self.is_local:
             raise NotInstalled('{} is not installed'.format(self.name))
-        git = Git(self.path)
-
+        if self.matches_pinned_sha():
+            LOG.info('Nothing new for ' + self.name)
+            return False
+        # Refuse before the previous version is backed up
         with git_to_msm_exceptions():
-            sha_before = git.rev_parse('HEAD')
+            modified_files = Git(self.path).status(porcelain=True,
+                                                   untracked='no')
+        if modified_files != '':
+            raise SkillModified('Uncommitted changes:\n' + modified_files)
+        return self._update()
 
-            modified_files = git.status(porcelain=True, untracked='no')
-            if modified_files != '':
-                raise SkillModified('Uncommitted changes:\n' + modified_files)
+    @_backup_previous_version
+    def _update(self):
+        git = Git(self.path)
 
+        with git_to_msm_exceptions():
+            sha_before = get_git_sha(self.path)
             git.fetch()
-            current_branch = git.rev_parse('--abbrev-ref', 'HEAD').strip()
-            if self.sha and current_branch in SWITCHABLE_BRANCHES:
-                # Check out correct branch
-                git.checkout(self._find_sha_branch())
-
-            git.merge(self.sha or 'origin/HEAD', ff_only=True)
+            try:
+                self._merge_remote(git)
+            except GitCommandError:
+                if not is_shallow_clone(self.path):
+                    raise
+                LOG.info('Fetching full history of ' + self.name)
+                _deepen(git)
+                self._merge_remote(git)
 
-        sha_after = git.rev_parse('HEAD')
+        sha_after = get_git_sha(self.path)
 
         if sha_before != sha_after:
             self.update_deps()
@@ -557,13 +804,16 @@ class SkillEntry(object):
     @staticmethod
     def find_git_url(path):
         """Get the git url from a folder"""
+        url = read_git_remote_url(path)
+        if url is not None:
+            return url
         try:
             LOG.debug(
                 'Attempting to retrieve the remote origin URL config for '
                 'skill in path ' + path
             )
             return Repo(path).remote('origin').url
-        except GitError:
+        except (GitError, ValueError):
             return ''
 
     def __repr__(self):
@@ -19,19 +19,23 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from glob import glob
+from fnmatch import fnmatch
 from os import makedirs
-from os.path import exists, join, isdir, dirname, basename, normpath
+from os.path import exists, join, isdir, dirname, normpath
 import json
+import time
+from shutil import rmtree
 from tempfile import gettempdir
+from threading import Lock, Thread
 
 from xdg import BaseDirectory
 from git import Repo
 from git.exc import GitCommandError, GitError
 
 from msm import git_to_msm_exceptions
-from msm.exceptions import MsmException
-from msm.util import cached_property, Git
+from msm.exceptions import GitException, MsmException
+from msm.meta_index import SkillsMetaIndex, open_meta_index
+from msm.util import cached_property, read_git_ref, Git
 import logging
 import requests
 
@@ -40,37 +44,136 @@ LOG = logging.getLogger(__name__)
 MYCROFT_SKILLS_DATA = ("https://raw.githubusercontent.com/"
                        "MycroftAI/mycroft-skills-data")
 FIVE_MINUTES = 300
+# Bump when the layout of the on-disk skill index changes
+SKILL_INDEX_VERSION = 1
+# Filter for partial clones of the skills repo, the small files at its
+# root are fetched with the commits instead of one by one on first read
+PARTIAL_CLONE_FILTER = 'blob:limit=1m'
+GITLINK_MODE = b'160000'
 
 
-def download_skills_data(branch, path):
-    """Download and if possible save skills meta-data as local cache.
+# Connect and read timeouts in seconds for requests to the skills data host
+REQUEST_TIMEOUT = (5, 30)
+
+# Pooled session reusing connections between requests
+http_session = requests.Session()
+
+
+def _validators_path(path):
+    return path + '.validators'
+
+
+def _load_validators(path, url):
+    """Load the HTTP cache validators stored next to the meta-data cache.
+
+    Arguments:
+        path: path to skills meta-data cache.
+        url: url the cache was downloaded from.
+
+    Returns:
+        (dict) validators (etag and/or last_modified) matching url.
+    """
+    if not exists(path):
+        return {}
+    try:
+        with open(_validators_path(path)) as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(validators, dict) or validators.get('url') != url:
+        return {}
+    return validators
+
+
+def _save_validators(path, url, response):
+    validators = {'url': url}
+    if response.headers.get('ETag'):
+        validators['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        validators['last_modified'] = response.headers['Last-Modified']
+    try:
+        with open(_validators_path(path), 'w') as f:
+            json.dump(validators, f)
+    except OSError as e:
+        LOG.warning('Couldn\'t save skills-metadata validators '
+                    '({})'.format(e))
+
+
+def _conditional_headers(validators):
+    headers = {}
+    if 'etag' in validators:
+        headers['If-None-Match'] = validators['etag']
+    if 'last_modified' in validators:
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def _download_skills_data(branch, path, conditional=True):
+    """Download skills meta-data and save it as local cache.
 
     Arguments:
         branch: skills-repo branch to fetch data for
         path: path to skills meta-data cache.
+        conditional: make the request conditional on the cached version
 
     Returns:
-        (dict) skills meta-data as dict.
+        (dict) skills meta-data as dict, empty if the download failed or
+        None if the cached version is not modified.
     """
     market_info_url = (MYCROFT_SKILLS_DATA + "/" + branch +
                        "/skill-metadata.json")
+    headers = {}
+    if conditional:
+        validators = _load_validators(path, market_info_url)
+        headers = _conditional_headers(validators)
     try:
-        info = requests.get(market_info_url).json()
-    except (requests.HTTPError, requests.exceptions.ConnectionError) as e:
+        response = http_session.get(market_info_url, headers=headers,
+                                    timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        info = response.json()
+    except (requests.RequestException, ValueError) as e:
         LOG.warning("Skill metadata couldn't be fetched "
                     "({})".format(repr(e)))
         info = {}
     if info:
         # Cache the received data
         try:
-            with open(path, 'w') as f:
-                json.dump(info, f)
+            with open(path, 'wb') as f:
+                f.write(response.content)
         except Exception as e:
             LOG.warning('Couldn\'t save cached version of '
                         'skills-metadata.json ({})'.format(e))
+        else:
+            _save_validators(path, market_info_url, response)
     return info
 
 
+def download_skills_data(branch, path):
+    """Download and if possible save skills meta-data as local cache.
+
+    If the cache was downloaded before the request is made conditional,
+    when the server reports the data as not modified the cache is used.
+
+    Arguments:
+        branch: skills-repo branch to fetch data for
+        path: path to skills meta-data cache.
+
+    Returns:
+        (dict) skills meta-data as dict.
+    """
+    info = _download_skills_data(branch, path)
+    if info is None:
+        info = load_cached_skills_data(path)
+        if info:
+            LOG.debug('Skill metadata not modified, using cache')
+            return info
+        # The cache is unusable, fetch the full data
+        info = _download_skills_data(branch, path, conditional=False)
+    return info or {}
+
+
 def load_cached_skills_data(path):
     """Load cached skills_data from file.
 
@@ -107,53 +210,337 @@ def load_skills_data(branch, path):
     if not info and exists(path):
         info = load_cached_skills_data(path)
 
-    # Return data indexed by repo
+    return index_skills_data(info)
+
+
+def index_skills_data(info):
+    """Index skills meta-data by the lower case url of the skill repo."""
     return {info[k]['repo'].lower(): info[k] for k in info}
 
 
+def load_skills_meta_index(branch, path, index_path, current=None):
+    """Load skills data as a compact memory-mapped index.
+
+    The data is downloaded like in load_skills_data but only parsed if the
+    index needs to be rebuilt.
+
+    Arguments:
+        branch: skills-repo branch to fetch data for
+        path: path to skills meta-data cache.
+        index_path: path of the index built from the cache.
+        current: index already open, reused if the cache didn't change.
+
+    Returns:
+        Mapping where key is a skill github repo and value is the meta-data
+        entry for the skill.
+    """
+    info = _download_skills_data(branch, path)
+
+    def load_meta_info():
+        return index_skills_data(info or load_cached_skills_data(path))
+
+    try:
+        return open_meta_index(path, index_path, load_meta_info, current)
+    except (OSError, ValueError) as e:
+        LOG.warning('Couldn\'t use skills meta index ({})'.format(e))
+        return load_meta_info()
+
+
 class SkillRepo(object):
-    def __init__(self, url=None, branch=None):
+    """Access to the mycroft-skills repo and the skills meta-data.
+
+    Arguments:
+        url (str): url of the skills repo
+        branch (str): branch of the skills repo to use
+        stale_while_revalidate (bool): answer skills_meta_info from the
+            local cache immediately and refresh it in a background thread
+            instead of blocking on the download.
+        fetch_interval (int): minimum number of seconds between fetches of
+            the skills repo, shared between processes through a file.
+        compact_meta_info (bool): keep skills_meta_info in a memory-mapped
+            index on disk and decode entries when they are looked up
+            instead of keeping all the meta-data in memory.
+        partial_clone (bool): clone and fetch only the tip of the branch
+            without large files (fetched on demand), falls back to a full
+            clone when the server or the git version doesn't support it.
+    """
+    def __init__(self, url=None, branch=None, stale_while_revalidate=False,
+                 fetch_interval=FIVE_MINUTES, partial_clone=True,
+                 compact_meta_info=False):
         self.path = join(BaseDirectory.save_data_path('mycroft'),
                          'skills-repo')
         self.url = url or "https://github.com/MycroftAI/mycroft-skills"
         self.branch = branch or "21.02"
         self.repo_info = {}
+        # (catalog commit, list of skill data tuples)
+        self._skill_index = None
+        # (skill data list, dict of skill name to pinned sha)
+        self._skill_shas = None
+        self.stale_while_revalidate = stale_while_revalidate
+        self._stale_meta_info = None
+        self._stale_meta_refreshed = None
+        self._meta_refresh_lock = Lock()
+        self._meta_refresh_thread = None
+        self.fetch_interval = fetch_interval
+        self.partial_clone = partial_clone
+        self.compact_meta_info = compact_meta_info
+        # Memory-mapped meta index in use, reused while the cache is unchanged
+        self._meta_index = None
+        self._meta_index_lock = Lock()
+        # Git instance owning the persistent cat-file process, see _read
+        self._object_git = None
+        self._object_lock = Lock()
 
-    @cached_property(ttl=FIVE_MINUTES)
+    @property
     def skills_meta_info(self):
+        """Skills meta-data keyed by the lower case url of the skill repo."""
+        if self.stale_while_revalidate:
+            return self._get_stale_skills_meta_info()
+        return self._skills_meta_info
+
+    @cached_property(ttl=FIVE_MINUTES)
+    def _skills_meta_info(self):
+        return self._load_skills_meta_info()
+
+    def _load_skills_meta_info(self):
         try:
-            skills_meta_cache = normpath(join(self.path,
-                                              '..', 'skills-meta.json'))
-            skills_meta_info = load_skills_data(self.branch,
-                                                skills_meta_cache)
+            if self.compact_meta_info:
+                skills_meta_info = load_skills_meta_index(
+                    self.branch, self.skills_meta_cache,
+                    self.skills_meta_index_path, self._meta_index
+                )
+            else:
+                skills_meta_info = load_skills_data(self.branch,
+                                                    self.skills_meta_cache)
         except Exception as e:
             LOG.exception(repr(e))
             skills_meta_info = {}
 
+        return self._use_meta_info(skills_meta_info)
+
+    def _use_meta_info(self, skills_meta_info):
+        """Remember the index in use to reuse it on the next load.
+
+        A replaced index isn't closed, threads may still be reading it. Its
+        memory map is released once it is no longer referenced.
+        """
+        if isinstance(skills_meta_info, SkillsMetaIndex):
+            with self._meta_index_lock:
+                self._meta_index = skills_meta_info
         return skills_meta_info
 
+    @property
+    def skills_meta_cache(self):
+        return normpath(join(self.path, '..', 'skills-meta.json'))
+
+    @property
+    def skills_meta_index_path(self):
+        return normpath(join(self.path, '..', 'skills-meta.idx'))
+
+    def _load_cached_skills_meta_info(self):
+        """Load skills meta-data from the local cache only."""
+        cache = self.skills_meta_cache
+
+        def load_meta_info():
+            return index_skills_data(load_cached_skills_data(cache))
+
+        if not exists(cache):
+            return {}
+        if self.compact_meta_info:
+            try:
+                return self._use_meta_info(open_meta_index(
+                    cache, self.skills_meta_index_path, load_meta_info,
+                    self._meta_index
+                ))
+            except (OSError, ValueError) as e:
+                LOG.warning('Couldn\'t use skills meta index ({})'.format(e))
+        return load_meta_info()
+
+    def _get_stale_skills_meta_info(self):
+        """Get the current meta-data without waiting for the network.
+
+        The local cache is read on first access. A background refresh is
+        started if the data is older than five minutes, until it completes
+        the previous data (or an empty dict without a cache) is returned.
+        """
+        if self._stale_meta_info is None:
+            self._stale_meta_info = self._load_cached_skills_meta_info()
+        now = time.monotonic()
+        if (self._stale_meta_refreshed is None or
+                now - self._stale_meta_refreshed > FIVE_MINUTES):
+            self._stale_meta_refreshed = now
+            self.refresh_skills_meta_info()
+        return self._stale_meta_info
+
+    def refresh_skills_meta_info(self):
+        """Refresh the meta-data used in stale_while_revalidate mode.
+
+        The download runs in a background thread. Only one refresh runs at
+        a time, if one is already in progress its thread is returned
+        instead of starting a new one.
+
+        Returns:
+            (Thread) thread performing the refresh
+        """
+        with self._meta_refresh_lock:
+            thread = self._meta_refresh_thread
+            if thread is None or not thread.is_alive():
+                thread = Thread(target=self._refresh_skills_meta_info,
+                                daemon=True)
+                thread.start()
+                self._meta_refresh_thread = thread
+        return thread
+
+    def _refresh_skills_meta_info(self):
+        skills_meta_info = self._load_skills_meta_info()
+        if skills_meta_info:
+            with self._meta_index_lock:
+                self._stale_meta_info = skills_meta_info
+
+    @property
+    def fetch_stamp_path(self):
+        return normpath(join(self.path, '..', 'skills-repo-fetch.json'))
+
+    @property
+    def skill_index_path(self):
+        return normpath(join(self.path, '..', 'skills-repo-index.json'))
+
+    def _read(self, ref):
+        """Read an object from the object database of the skills repo.
+
+        A single persistent git cat-file --batch process serves all reads.
+
+        Arguments:
+            ref (str): object name, e.g. a sha or <commit>:<path>
+        Returns:
+            (tuple) sha, type and content of the object
+        """
+        with self._object_lock:
+            git = self._object_git
+            if git is None or git.working_dir != self.path:
+                self._close_object_reader()
+                git = self._object_git = Git(self.path)
+            try:
+                sha, typ, _, data = git.get_object_data(ref)
+            except ValueError:
+                raise FileNotFoundError('{} not found in {}'.format(
+                    ref, self.path
+                ))
+            except Exception:
+                # The process may be in an undefined state, restart it
+                self._close_object_reader()
+                raise
+        return sha.decode(), typ.decode(), data
+
+    def _close_object_reader(self):
+        if self._object_git is not None:
+            self._object_git.clear_cache()
+            self._object_git = None
+
+    def _read_tree(self):
+        """Generate (mode, name, sha) entries of the catalog root tree."""
+        commit = self.get_catalog_commit()
+        _, _, data = self._read(commit + '^{tree}')
+        sha_size = len(commit) // 2
+        pos = 0
+        while pos < len(data):
+            mode_end = data.index(b' ', pos)
+            name_end = data.index(b'\0', mode_end)
+            sha_end = name_end + 1 + sha_size
+            yield (data[pos:mode_end], data[mode_end + 1:name_end].decode(),
+                   data[name_end + 1:sha_end].hex())
+            pos = sha_end
+
     def read_file(self, filename):
-        with open(join(self.path, filename)) as f:
-            return f.read()
+        """Read a file from the catalog commit of the skills repo."""
+        ref = '{}:{}'.format(self.get_catalog_commit(), filename)
+        return self._read(ref)[2].decode()
+
+    def __clone(self):
+        if self.partial_clone:
+            try:
+                Repo.clone_from(self.url, self.path, branch=self.branch,
+                                single_branch=True, depth=1,
+                                filter=PARTIAL_CLONE_FILTER,
+                                no_checkout=True)
+                return
+            except GitCommandError as e:
+                LOG.warning('Partial clone of skills repo failed, falling '
+                            'back to full clone ({})'.format(repr(e)))
+                if isdir(self.path):
+                    rmtree(self.path)
+        Repo.clone_from(self.url, self.path, no_checkout=True)
+
+    def __fetch(self, git):
+        if self.partial_clone:
+            refspec = '+refs/heads/{0}:refs/remotes/origin/{0}'.format(
+                self.branch
+            )
+            try:
+                git.fetch('origin', refspec, depth=1)
+                return
+            except GitCommandError as e:
+                LOG.debug('Shallow fetch of skills repo failed, falling '
+                          'back to full fetch ({})'.format(repr(e)))
+        git.fetch()
 
     def __prepare_repo(self):
         if not exists(dirname(self.path)):
             makedirs(dirname(self.path))
 
         if not isdir(self.path):
-            Repo.clone_from(self.url, self.path)
+            self.__clone()
 
         git = Git(self.path)
         git.config('remote.origin.url', self.url)
-        git.fetch()
+        self.__fetch(git)
 
+        # Files are read from origin/<branch> so no checkout is needed,
+        # restart the object reader to pick up the fetched objects
+        with self._object_lock:
+            self._close_object_reader()
         try:
-            git.checkout(self.branch)
-            git.reset('origin/' + self.branch, hard=True)
-        except GitCommandError:
+            self.get_catalog_commit()
+        except GitException:
             raise MsmException('Invalid branch: ' + self.branch)
+        self._save_fetch_stamp()
+
+    def _fetched_recently(self):
+        """Check if the repo was fetched within the fetch interval.
+
+        The fetch is only considered recent if it was made for the current
+        url and branch.
+        """
+        if not self.fetch_interval or not isdir(self.path):
+            return False
+        try:
+            with open(self.fetch_stamp_path) as f:
+                stamp = json.load(f)
+            elapsed = time.time() - stamp['time']
+            return (stamp['url'] == self.url and
+                    stamp['branch'] == self.branch and
+                    0 <= elapsed < self.fetch_interval)
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _save_fetch_stamp(self):
+        try:
+            with open(self.fetch_stamp_path, 'w') as f:
+                json.dump({'url': self.url, 'branch': self.branch,
+                           'time': time.time()}, f)
+        except OSError as e:
+            LOG.warning('Couldn\'t save skills-repo fetch time ({})'.format(e))
+
+    def update(self, force=False):
+        """Fetch the latest version of the skills repo.
 
-    def update(self):
+        Arguments:
+            force (bool): fetch even if the repo was fetched within the
+                          fetch interval
+        """
+        if not force and self._fetched_recently():
+            LOG.debug('Skills repo fetched recently, skipping update')
+            return
         try:
             self.__prepare_repo()
         except (GitError, PermissionError) as e:
@@ -173,6 +560,73 @@ class SkillRepo(object):
 
     def get_skill_data(self):
         """ generates tuples of name, path, url, sha """
+        yield from self._get_skill_index()
+
+    def get_skill_shas(self):
+        """Get a dict of skill name to the sha pinned in the catalog.
+
+        The dict is shared between callers and only rebuilt when the
+        catalog commit changes, it must not be modified.
+        """
+        skill_data = self._get_skill_index()
+        if self._skill_shas is None or self._skill_shas[0] is not skill_data:
+            shas = {name: sha for name, _, _, sha in skill_data}
+            self._skill_shas = (skill_data, shas)
+        return self._skill_shas[1]
+
+    def get_catalog_commit(self):
+        """Resolve the commit of origin/<branch> the catalog is read from."""
+        sha = read_git_ref(self.path, 'refs/remotes/origin/' + self.branch)
+        if sha:
+            return sha
+        try:
+            sha, typ, _ = self._read('origin/' + self.branch)
+        except FileNotFoundError as e:
+            raise GitException(str(e)) from e
+        if typ != 'commit':
+            raise GitException('origin/{} is not a commit'.format(self.branch))
+        return sha
+
+    def _get_skill_index(self):
+        """Get the parsed skill data of the current catalog commit.
+
+        Parsing .gitmodules and listing the tree is only done when the
+        commit of origin/<branch> changes, the result is kept in memory and
+        on disk so it can be reused by other msm instances.
+        """
+        commit = self.get_catalog_commit()
+        if self._skill_index is None or self._skill_index[0] != commit:
+            skill_data = self._load_skill_index(commit)
+            if skill_data is None:
+                skill_data = list(self._parse_skill_data())
+                self._save_skill_index(commit, skill_data)
+            self._skill_index = (commit, skill_data)
+        return self._skill_index[1]
+
+    def _load_skill_index(self, commit):
+        """Load skill data from the on-disk index if it matches commit."""
+        try:
+            with open(self.skill_index_path) as f:
+                index = json.load(f)
+            if (index['version'] == SKILL_INDEX_VERSION and
+                    index['commit'] == commit):
+                return [tuple(skill) for skill in index['skills']]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            LOG.warning('Ignoring invalid skills-repo index ({})'.format(e))
+        return None
+
+    def _save_skill_index(self, commit, skill_data):
+        try:
+            with open(self.skill_index_path, 'w') as f:
+                json.dump({'version': SKILL_INDEX_VERSION, 'commit': commit,
+                           'skills': skill_data}, f)
+        except OSError as e:
+            LOG.warning('Couldn\'t save skills-repo index ({})'.format(e))
+
+    def _parse_skill_data(self):
+        """Parse .gitmodules and the catalog tree into skill data tuples."""
         path_to_sha = {
             folder: sha for folder, sha in self.get_shas()
         }
@@ -192,22 +646,21 @@ class SkillRepo(object):
                 ))
 
     def get_shas(self):
-        git = Git(self.path)
-        with git_to_msm_exceptions():
-            shas = git.ls_tree('origin/' + self.branch)
-        for line in shas.split('\n'):
-            size, typ, sha, folder = line.split()
-            if typ != 'commit':
+        for mode, folder, sha in self._read_tree():
+            if mode != GITLINK_MODE:
                 continue
             yield folder, sha
 
     def get_default_skill_names(self):
-        for defaults_file in glob(join(self.path, 'DEFAULT-SKILLS*')):
-            with open(defaults_file) as f:
-                skills = list(filter(
-                    lambda x: x and not x.startswith('#'),
-                    map(str.strip, f.read().split('\n'))
-                ))
-            platform = basename(defaults_file).replace('DEFAULT-SKILLS', '')
+        defaults_files = [
+            (name, sha) for mode, name, sha in self._read_tree()
+            if mode != GITLINK_MODE and fnmatch(name, 'DEFAULT-SKILLS*')
+        ]
+        for defaults_file, sha in defaults_files:
+            skills = list(filter(
+                lambda x: x and not x.startswith('#'),
+                map(str.strip, self._read(sha)[2].decode().split('\n'))
+            ))
+            platform = defaults_file.replace('DEFAULT-SKILLS', '')
             platform = platform.replace('.', '') or 'default'
             yield platform, skills
@@ -0,0 +1,107 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Search of skills by name, scoring like SkillEntry.match.
+
+The index holds the trigrams of the skill names. The skills sharing the
+most trigrams with a query are scored first to find a good match early.
+Every other skill is only scored if an upper bound of its score, from
+SequenceMatcher.quick_ratio, can reach the requested minimum, so the
+results equal scoring all skills.
+"""
+from collections import Counter, defaultdict
+
+from msm.skill_entry import MATCH_COMMON_TOKENS, SkillEntry, _MatchScorer
+
+# Number of skills scored before pruning by upper bounds
+SHORTLIST_SIZE = 10
+
+
+def _trigrams(text):
+    trigrams = set()
+    for token in text.split():
+        padded = ' {} '.format(token)
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def _upper_bound_ratio(matcher):
+    return matcher.quick_ratio()
+
+
+class SkillSearchIndex(object):
+    """Trigram index over the names of a list of skills.
+
+    Arguments:
+        skills (list): skills to search, the index is only valid as long
+                       as the list is not modified
+    """
+
+    def __init__(self, skills):
+        self.skills = skills
+        self._postings = defaultdict(list)
+        for i, skill in enumerate(skills):
+            name = skill.match_tokens[0]
+            for trigram in _trigrams(name):
+                self._postings[trigram].append(i)
+
+    def _shortlist(self, search):
+        counts = Counter()
+        for trigram in _trigrams(search):
+            counts.update(self._postings.get(trigram, ()))
+        return [i for i, _ in counts.most_common(SHORTLIST_SIZE)]
+
+    def match_all(self, query, author=None, min_score=0.0, relative=0.0):
+        """Score the skills that can reach a minimum score.
+
+        Arguments:
+            query (str): name to search for
+            author (str): author to search for
+            min_score (float): skills certainly scoring below it are left
+                               out
+            relative (float): skills certainly scoring below this fraction
+                              of the best score are left out
+        Returns:
+            (list) skill and score tuples like SkillEntry.match(), in the
+            order of the skills. May include skills below the minimum.
+        """
+        scorer = _MatchScorer(query, author)
+        search, _, _ = SkillEntry._extract_tokens(query, MATCH_COMMON_TOKENS)
+        shortlist = self._shortlist(search)
+        shortlisted = set(shortlist)
+        order = shortlist + [
+            i for i in range(len(self.skills)) if i not in shortlisted
+        ]
+
+        scores = {}
+        best_score = 0.0
+        for i in order:
+            skill = self.skills[i]
+            if i not in shortlisted:
+                min_needed = max(min_score, relative * best_score)
+                upper_bound = scorer.score(skill.match_tokens, skill.author,
+                                           _upper_bound_ratio)
+                if upper_bound < min_needed:
+                    continue
+            score = scorer.score(skill.match_tokens, skill.author)
+            scores[i] = score
+            best_score = max(best_score, score)
+        return [(self.skills[i], scores[i]) for i in sorted(scores)]
@@ -25,6 +25,123 @@ if isfile(old_skill_state_path):
     shutil.move(old_skill_state_path, get_state_path())
 
 
+class SkillStateList(list):
+    """Skill entries of the device skill state, indexed by name.
+
+    Appending updates the index, other changes of the list rebuild it.
+    Changing the name of an entry in place isn't noticed.
+    """
+
+    def __init__(self, entries=()):
+        super(SkillStateList, self).__init__(entries)
+        self._reindex()
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles rebuild the index from the entries
+        return self.__class__, (list(self),)
+
+    def _reindex(self):
+        self._by_name = {}
+        for entry in self:
+            self._by_name.setdefault(entry.get('name'), []).append(entry)
+
+    def find(self, name):
+        """Get the last entry of a skill or None."""
+        entries = self._by_name.get(name)
+        return entries[-1] if entries else None
+
+    def find_all(self, name):
+        """Get all entries of a skill."""
+        return list(self._by_name.get(name, []))
+
+    def remove_entries(self, entries):
+        """Remove several entries in one pass."""
+        ids = {id(entry) for entry in entries}
+        if ids:
+            self[:] = [entry for entry in self if id(entry) not in ids]
+
+    def append(self, entry):
+        super(SkillStateList, self).append(entry)
+        self._by_name.setdefault(entry.get('name'), []).append(entry)
+
+    def extend(self, entries):
+        super(SkillStateList, self).extend(entries)
+        self._reindex()
+
+    def insert(self, index, entry):
+        super(SkillStateList, self).insert(index, entry)
+        self._reindex()
+
+    def remove(self, entry):
+        super(SkillStateList, self).remove(entry)
+        self._reindex()
+
+    def pop(self, index=-1):
+        entry = super(SkillStateList, self).pop(index)
+        self._reindex()
+        return entry
+
+    def clear(self):
+        super(SkillStateList, self).clear()
+        self._reindex()
+
+    def sort(self, *args, **kwargs):
+        super(SkillStateList, self).sort(*args, **kwargs)
+        self._reindex()
+
+    def reverse(self):
+        super(SkillStateList, self).reverse()
+        self._reindex()
+
+    def __setitem__(self, index, value):
+        super(SkillStateList, self).__setitem__(index, value)
+        self._reindex()
+
+    def __delitem__(self, index):
+        super(SkillStateList, self).__delitem__(index)
+        self._reindex()
+
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+
+    def __imul__(self, count):
+        super(SkillStateList, self).__imul__(count)
+        self._reindex()
+        return self
+
+
+class DeviceSkillState(dict):
+    """Contents of skills.json with the skill entries indexed by name.
+
+    The skills list is kept as a SkillStateList, the state serializes to
+    the same json as a plain dict.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DeviceSkillState, self).__init__()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key == 'skills' and not isinstance(value, SkillStateList):
+            value = SkillStateList(value)
+        super(DeviceSkillState, self).__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def get_skill(self, name):
+        """Get the last entry of a skill or an empty dict."""
+        skills = self.get('skills')
+        return (skills.find(name) if skills else None) or {}
+
+
 def load_device_skill_state() -> dict:
     """Contains info on how skills should be updated"""
     skills_data_path = get_state_path()
@@ -36,7 +153,7 @@ def load_device_skill_state() -> dict:
         except json.JSONDecodeError:
             LOG.exception('failed to load skills.json')
 
-    return device_skill_state
+    return DeviceSkillState(device_skill_state)
 
 
 def write_device_skill_state(data: dict):
@@ -54,6 +171,9 @@ def write_device_skill_state(data: dict):
 
 def get_skill_state(name, device_skill_state) -> dict:
     """Find a skill entry in the device skill state and returns it."""
+    if isinstance(device_skill_state, DeviceSkillState):
+        return device_skill_state.get_skill(name)
+
     skill_state_return = {}
     for skill_state in device_skill_state.get('skills', []):
         if skill_state.get('name') == name:
@@ -0,0 +1,248 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Installation of the system packages of several skills at once."""
+import logging
+import shutil
+import subprocess
+from collections import OrderedDict
+from threading import Lock
+
+from pako import PakoManager, PackageFormat
+
+from msm.exceptions import SkillRequirementsException
+
+LOG = logging.getLogger(__name__)
+
+RPM_QUERY = ['rpm', '-q', '--queryformat', '%{NAME}\\n']
+# Commands listing which of the package names passed to them are installed
+QUERY_COMMANDS = {
+    'apt-get': ['dpkg-query', '--show',
+                '--showformat', '${db:Status-Abbrev} ${Package}\\n'],
+    'dnf': RPM_QUERY,
+    'yum': RPM_QUERY,
+    'zypper': RPM_QUERY,
+    'rpm-ostree': RPM_QUERY,
+    'pacman': ['pacman', '--query', '--quiet'],
+    'apk': ['apk', 'info', '--installed']
+}
+
+
+def _parse_query_output(manager_name, output, names):
+    installed = set()
+    for line in output.splitlines():
+        if manager_name == 'apt-get':
+            status, _, line = line.partition(' ')
+            if status != 'ii':
+                continue
+        name = line.strip()
+        if name in names:
+            installed.add(name)
+    return installed
+
+
+def installed_packages(manager_name, names):
+    """Find the installed packages among names with one query.
+
+    Arguments:
+        manager_name (str): name of the package manager used by pako
+        names (list): system specific package names
+    Returns:
+        (set) names of the installed packages, empty if the package
+        manager can't be queried
+    """
+    command = QUERY_COMMANDS.get(manager_name)
+    if not command or not names:
+        return set()
+    try:
+        proc = subprocess.run(command + sorted(names), stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+    except OSError as e:
+        LOG.warning('Could not query installed packages ({})'.format(e))
+        return set()
+    # The exit code is an error if any of the packages is missing
+    return _parse_query_output(manager_name, proc.stdout.decode(), names)
+
+
+def _candidate_names(manager, package):
+    """Get the system specific names pako tries for a package."""
+    package, fmt = PackageFormat.parse(package)
+    names = []
+    for format_name, formats in manager.config['formats'].items():
+        if not fmt or format_name == fmt:
+            names += [name.format(package) for name in formats]
+    return names
+
+
+def _unique(items):
+    return list(OrderedDict.fromkeys(items))
+
+
+class SystemPackageBatch(object):
+    """System packages of several skills, installed together.
+
+    The missing packages, found with one query, are installed with one
+    package manager call for the names specific to the package manager
+    and one for the generic names resolved to the first name pako tries.
+    If a call fails the packages are installed one by one, so a broken
+    package only fails the skills that need it. The executables the
+    skills need are looked up once for all skills.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._requests = []
+
+    def add(self, skill, packages, overrides=None, exes=None,
+            rollback=None):
+        """Queue the system packages of a skill.
+
+        Arguments:
+            skill (SkillEntry): skill needing the packages
+            packages (list): package names for any package manager
+            overrides (dict): package names by package manager
+            exes (list): executables the skill needs
+            rollback (callable): undoes the skill action if the
+                                 executables are missing afterwards
+        """
+        with self._lock:
+            self._requests.append((skill, list(packages), overrides or {},
+                                   list(exes or []), rollback))
+
+    def __len__(self):
+        return len(self._requests)
+
+    @staticmethod
+    def _install_names(manager, names):
+        """Install system specific names with one package manager call.
+
+        If that fails the names are installed one by one.
+
+        Returns:
+            (list) names that couldn't be installed
+        """
+        LOG.info('Installing system packages: ' + ' '.join(names))
+        if manager.install([], overrides={manager.name: names},
+                           flags=['no-confirm']):
+            return []
+        if len(names) == 1:
+            return names
+        return [
+            name for name in names
+            if not manager.install([], overrides={manager.name: [name]},
+                                   flags=['no-confirm'])
+        ]
+
+    def _install(self, manager, requests):
+        """Install the missing packages of the requests.
+
+        Returns:
+            (set) packages or system specific names that failed
+        """
+        specific, generic = [], []
+        for _, packages, overrides, _, _ in requests:
+            if not packages:
+                continue
+            if manager.name in overrides:
+                specific += overrides[manager.name]
+            else:
+                generic += packages
+        specific, generic = _unique(specific), _unique(generic)
+
+        candidates = {
+            package: _candidate_names(manager, package) for package in generic
+        }
+        installed = installed_packages(
+            manager.name,
+            specific + [name for names in candidates.values()
+                        for name in names]
+        )
+        specific = [name for name in specific if name not in installed]
+        generic = [
+            package for package in generic
+            if not installed.intersection(candidates[package])
+        ]
+
+        # Packages of a format the package manager has no names for
+        failed = {package for package in generic if not candidates[package]}
+        generic = [package for package in generic if candidates[package]]
+        if specific:
+            failed.update(self._install_names(manager, specific))
+        if generic:
+            # Try the name pako tries first for all packages at once
+            first_names = _unique(candidates[package][0]
+                                  for package in generic)
+            LOG.info('Installing system packages: ' + ' '.join(first_names))
+            if not manager.install([], overrides={manager.name: first_names},
+                                   flags=['no-confirm']):
+                # Let pako try every name of each package, one by one
+                failed.update(
+                    package for package in generic
+                    if not manager.install_one(package, flags=['no-confirm'])
+                )
+        return failed
+
+    @staticmethod
+    def _log_failed_packages(manager, requests, failed_packages):
+        for skill, packages, overrides, _, _ in requests:
+            names = overrides.get(manager.name, packages) if packages else []
+            failed = [name for name in names if name in failed_packages]
+            if failed:
+                LOG.warning('Failed to install system packages of {}: '
+                            '{}'.format(skill.name, ' '.join(failed)))
+
+    def run(self):
+        """Install all queued system packages.
+
+        Skills missing executables afterwards are rolled back.
+
+        Returns:
+            (dict) SkillRequirementsException of each failed skill
+        """
+        with self._lock:
+            requests, self._requests = self._requests, []
+        failed_packages = set()
+        if any(request[1] for request in requests):
+            try:
+                manager = PakoManager()
+                failed_packages = self._install(manager, requests)
+            except RuntimeError as e:
+                LOG.warning('Failed to launch package manager: {}'.format(e))
+            else:
+                self._log_failed_packages(manager, requests, failed_packages)
+
+        exes = _unique(exe for request in requests for exe in request[3])
+        missing_exes = {exe for exe in exes if not shutil.which(exe)}
+        failures = {}
+        for skill, _, _, exes, rollback in requests:
+            missing = [exe for exe in exes if exe in missing_exes]
+            if not missing:
+                continue
+            failures[skill] = SkillRequirementsException(
+                'Could not find exes: {}'.format(', '.join(missing))
+            )
+            if rollback:
+                LOG.info('Rolling back ' + skill.name)
+                try:
+                    rollback()
+                except Exception:
+                    LOG.exception('Could not roll back ' + skill.name)
+        return failures
@@ -19,11 +19,14 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+import re
 import time
+from collections import OrderedDict
+from threading import Lock
 
 import git
-from os import chmod
-from os.path import exists, join
+from os import chmod, stat
+from os.path import exists, join, isdir, isfile, normpath
 from tempfile import gettempdir
 
 from fasteners.process_lock import InterProcessLock
@@ -42,6 +45,242 @@ class Git(git.cmd.Git):
         return wrapper
 
 
+SHA_PATTERN = re.compile(r'^([0-9a-f]{40}|[0-9a-f]{64})$')
+
+
+def find_git_dir(path):
+    """Find the git directories of the checkout at path.
+
+    Handles .git directories as well as .git files pointing to the git
+    directory of a worktree or submodule.
+
+    Arguments:
+        path (str): root folder of a checkout
+    Returns:
+        (tuple) git dir and common dir (holding the shared refs) or None
+        if path doesn't contain a .git entry.
+    """
+    git_path = join(path, '.git')
+    if isdir(git_path):
+        git_dir = git_path
+    elif isfile(git_path):
+        with open(git_path) as f:
+            content = f.read().strip()
+        if not content.startswith('gitdir:'):
+            return None
+        git_dir = normpath(join(path, content[len('gitdir:'):].strip()))
+    else:
+        return None
+
+    common_dir = git_dir
+    try:
+        with open(join(git_dir, 'commondir')) as f:
+            common_dir = normpath(join(git_dir, f.read().strip()))
+    except FileNotFoundError:
+        pass
+    return git_dir, common_dir
+
+
+def is_shallow_clone(path):
+    """Check if the checkout at path is a shallow clone."""
+    git_dirs = find_git_dir(path)
+    return bool(git_dirs) and isfile(join(git_dirs[1], 'shallow'))
+
+
+def _read_packed_ref(common_dir, ref):
+    try:
+        with open(join(common_dir, 'packed-refs')) as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                sha, _, name = line.rstrip('\n').partition(' ')
+                if name == ref:
+                    return sha
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def read_git_ref(path, ref='HEAD'):
+    """Resolve a ref of the checkout at path by reading the git files.
+
+    Reads HEAD, loose refs and packed-refs without starting a git process.
+
+    Arguments:
+        path (str): root folder of a checkout
+        ref (str): HEAD or a full ref name like refs/remotes/origin/HEAD
+    Returns:
+        (str) sha of the ref or None if it can't be resolved this way
+    """
+    try:
+        git_dirs = find_git_dir(path)
+        if git_dirs is None:
+            return None
+        git_dir, common_dir = git_dirs
+        for _ in range(5):  # Limit the depth of symbolic refs
+            # HEAD is per worktree, other refs are shared
+            ref_dir = git_dir if ref == 'HEAD' else common_dir
+            try:
+                with open(join(ref_dir, ref)) as f:
+                    content = f.read().strip()
+            except (FileNotFoundError, IsADirectoryError):
+                content = _read_packed_ref(common_dir, ref)
+            if content is None:
+                return None
+            if content.startswith('ref:'):
+                ref = content[len('ref:'):].strip()
+                continue
+            return content if SHA_PATTERN.match(content) else None
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+def get_git_sha(path, ref='HEAD'):
+    """Get the sha of a ref of the checkout at path.
+
+    The git files are read directly, git is only started for layouts
+    read_git_ref doesn't handle.
+
+    Arguments:
+        path (str): root folder of a checkout
+        ref (str): HEAD or a full ref name like refs/remotes/origin/HEAD
+    Returns:
+        (str) sha of the ref
+    Raises:
+        GitCommandError: if git can't resolve the ref either
+    """
+    return read_git_ref(path, ref) or Git(path).rev_parse(ref)
+
+
+# Parsed git configs: config path -> ((mtime, size), remote urls or None)
+_git_config_cache = {}
+CONFIG_SECTION_PATTERN = re.compile(r'^\[\s*([\w.-]+)(?:\s+"(.*)")?\s*\]')
+CONFIG_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b'}
+
+
+def _parse_config_value(raw):
+    """Parse a git config value, handling quotes, escapes and comments."""
+    value = []
+    in_quotes = False
+    chars = iter(raw.strip())
+    for char in chars:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == '\\':
+            escaped = next(chars, '')
+            value.append(CONFIG_ESCAPES.get(escaped, escaped))
+        elif char in '#;' and not in_quotes:
+            break
+        else:
+            value.append(char)
+    return ''.join(value).strip()
+
+
+def _parse_remote_urls(config_path):
+    """Get the remote urls from a git config file.
+
+    Returns:
+        (dict) remote name to url or None if the config uses features this
+        parser doesn't handle (includes, line continuations)
+    """
+    urls = {}
+    remote = None
+    with open(config_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(('#', ';')):
+                continue
+            if line.startswith('['):
+                match = CONFIG_SECTION_PATTERN.match(line)
+                if not match:
+                    return None
+                section, subsection = match.groups()
+                if section.lower() in ('include', 'includeif'):
+                    return None
+                remote = subsection if section.lower() == 'remote' else None
+                # Keys may follow the section header on the same line
+                line = line[match.end():].strip()
+                if not line:
+                    continue
+            if line.endswith('\\'):
+                return None
+            key, _, value = line.partition('=')
+            if remote is not None and key.strip().lower() == 'url':
+                urls[remote] = _parse_config_value(value)
+    return urls
+
+
+def read_git_remote_url(path, remote='origin'):
+    """Get the url of a remote of the checkout at path from its config.
+
+    The parsed config is cached until the file is modified.
+
+    Arguments:
+        path (str): root folder of a checkout
+        remote (str): name of the remote
+    Returns:
+        (str) url of the remote or None if it can't be read from the config
+    """
+    try:
+        git_dirs = find_git_dir(path)
+        if git_dirs is None:
+            return None
+        config_path = join(git_dirs[1], 'config')
+        config_stat = stat(config_path)
+        key = (config_stat.st_mtime_ns, config_stat.st_size)
+        cached = _git_config_cache.get(config_path)
+        if cached is None or cached[0] != key:
+            cached = (key, _parse_remote_urls(config_path))
+            _git_config_cache[config_path] = cached
+    except (OSError, UnicodeDecodeError):
+        return None
+    urls = cached[1]
+    return urls.get(remote) if urls is not None else None
+
+
+class LruCache(object):
+    """Mapping of limited size dropping the least recently used items.
+
+    Arguments:
+        max_size (int): number of items kept
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        """Get the value of key, counting the lookup as a hit or miss."""
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Remove all items, the hit and miss counters are kept."""
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
 class MsmProcessLock(InterProcessLock):
     def __init__(self):
         lock_path = join(gettempdir(), 'msm_lock')
@@ -0,0 +1,63 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Helpers shared by the tests working on local git repos."""
+import subprocess
+import tempfile
+from pathlib import Path
+from shutil import rmtree
+from unittest import TestCase
+
+
+def git(cwd, *args):
+    """Run git in cwd with a fixed identity and return the stripped output.
+    """
+    return subprocess.check_output(
+        ['git', '-c', 'user.name=msm', '-c', 'user.email=msm@example.com',
+         '-c', 'init.defaultBranch=master'] + list(args),
+        cwd=str(cwd), stderr=subprocess.STDOUT
+    ).decode().strip()
+
+
+class TempDirTestCase(TestCase):
+    """Test case with a temporary folder in self.temp_dir."""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(rmtree, str(self.temp_dir))
+
+
+class SkillSourceTestCase(TempDirTestCase):
+    """Test case with the git repo of a skill in self.source."""
+
+    def setUp(self):
+        super().setUp()
+        self.source = self.temp_dir.joinpath('skill-test')
+        self.source.mkdir()
+        git(self.source, 'init', '-q')
+
+    def _commit(self, content):
+        """Commit content as the __init__.py of the skill, returns the sha.
+        """
+        self.source.joinpath('__init__.py').write_text(content)
+        git(self.source, 'add', '__init__.py')
+        git(self.source, 'commit', '-q', '-m', content)
+        return git(self.source, 'rev-parse', 'HEAD')
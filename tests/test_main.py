@@ -20,6 +20,7 @@
 # specific language governing permissions and limitations
 # under the License.
 from os.path import dirname, abspath, join
+from unittest.mock import patch
 
 import pytest
 from shutil import rmtree
@@ -67,4 +68,29 @@ class TestMain(object):
             self('info skill-c')
         self('info skill-cd')
         self('list')
+        self('update --check')
         self('default')
+
+
+class TestMirrorCacheArgs(object):
+    def _main(self, *params):
+        with patch('msm.__main__.SkillRepo'), \
+                patch('msm.__main__.MycroftSkillsManager') as msm, \
+                patch('msm.__main__.SkillMirrorCache') as mirror_cache:
+            assert main(list(params), lambda text: None) == 0
+        return msm, mirror_cache
+
+    def test_mirror_cache_before_action(self):
+        msm, mirror_cache = self._main('-m', 'list')
+        mirror_cache.assert_called_once_with(None)
+        assert msm.call_args[1]['mirror_cache'] is mirror_cache.return_value
+
+    def test_mirror_cache_dir(self):
+        _, mirror_cache = self._main('--mirror-cache-dir', '/tmp/mirrors',
+                                     'list')
+        mirror_cache.assert_called_once_with('/tmp/mirrors')
+
+    def test_no_mirror_cache(self):
+        msm, mirror_cache = self._main('list')
+        mirror_cache.assert_not_called()
+        assert msm.call_args[1]['mirror_cache'] is None
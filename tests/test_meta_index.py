@@ -0,0 +1,204 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import json
+from pathlib import Path
+from threading import Event, Thread
+from unittest.mock import Mock, patch
+
+from msm import SkillEntry, SkillRepo
+from msm.meta_index import SkillsMetaIndex, open_meta_index
+from msm.skill_repo import index_skills_data
+
+from helpers import TempDirTestCase
+
+SKILLS_DATA = {
+    'skill-weather': {
+        'repo': 'https://github.com/MycroftAI/skill-weather',
+        'skill_gid': 'mycroft-weather|21.02'
+    },
+    'skill-timer': {
+        'repo': 'https://github.com/MycroftAI/Skill-Timer',
+        'skill_gid': 'mycroft-timer|21.02'
+    },
+    'skill-cocktails': {
+        'repo': 'https://github.com/forslund/skill-cocktails',
+        'skill_gid': 'skill-cocktails|21.02',
+        'tags': ['drinks', 'äöå']
+    }
+}
+
+
+class TestSkillsMetaIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source_path = str(self.temp_dir.joinpath('skills-meta.json'))
+        self.index_path = str(self.temp_dir.joinpath('skills-meta.idx'))
+        self._write_source(SKILLS_DATA)
+
+    def _write_source(self, data):
+        with open(self.source_path, 'w') as f:
+            json.dump(data, f)
+        self.meta_info = index_skills_data(data)
+
+    def _open(self):
+        load_mock = Mock(return_value=self.meta_info)
+        index = open_meta_index(self.source_path, self.index_path,
+                                load_mock)
+        return index, load_mock.call_count
+
+    def test_lookup(self):
+        index, _ = self._open()
+        assert isinstance(index, SkillsMetaIndex)
+        assert len(index) == 3
+        assert dict(index) == self.meta_info
+        url = 'https://github.com/mycroftai/skill-timer'
+        assert index.get(url) == SKILLS_DATA['skill-timer']
+        assert index.get('https://github.com/unknown/skill', {}) == {}
+        with self.assertRaises(KeyError):
+            index['https://github.com/forslund']
+
+    def test_rebuilt_only_when_source_changes(self):
+        _, builds = self._open()
+        assert builds == 1
+        _, builds = self._open()
+        assert builds == 0
+
+        self._write_source({'skill-weather': SKILLS_DATA['skill-weather']})
+        index, builds = self._open()
+        assert builds == 1
+        assert list(index) == ['https://github.com/mycroftai/skill-weather']
+
+    def test_invalid_index_rebuilt(self):
+        with open(self.index_path, 'wb') as f:
+            f.write(b'not an index')
+        index, builds = self._open()
+        assert builds == 1
+        assert dict(index) == self.meta_info
+
+    def test_missing_source(self):
+        self.source_path += '.missing'
+        index, builds = self._open()
+        assert index == {}
+        assert builds == 0
+
+    def test_empty_index(self):
+        self.meta_info = {}
+        index, _ = self._open()
+        assert len(index) == 0
+        assert index.get('https://github.com/mycroftai/skill-weather') is None
+
+
+class TestSkillRepoCompactMetaInfo(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = SkillRepo(compact_meta_info=True)
+        self.repo.path = str(self.temp_dir.joinpath('skills-repo'))
+
+    def _download(self, branch, path, conditional=True):
+        if not Path(path).exists():
+            with open(path, 'w') as f:
+                json.dump(SKILLS_DATA, f)
+            return SKILLS_DATA
+        return None  # Not modified
+
+    def test_skills_meta_info(self):
+        with patch('msm.skill_repo._download_skills_data',
+                   side_effect=self._download):
+            meta_info = self.repo.skills_meta_info
+            assert isinstance(meta_info, SkillsMetaIndex)
+            assert dict(meta_info) == index_skills_data(SKILLS_DATA)
+
+            # Not modified, the index is used without parsing the cache
+            del self.repo._cache['_skills_meta_info']
+            with patch('msm.skill_repo.load_cached_skills_data') as load:
+                assert len(self.repo.skills_meta_info) == 3
+            load.assert_not_called()
+
+    def _reload(self):
+        del self.repo._cache['_skills_meta_info']
+        return self.repo.skills_meta_info
+
+    def _download_new_version(self, branch, path, conditional=True):
+        data = dict(SKILLS_DATA, **{'skill-new': {
+            'repo': 'https://github.com/someone/skill-new-{}'.format(
+                self.version
+            )
+        }})
+        self.version += 1
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return data
+
+    def test_unchanged_index_reused(self):
+        with patch('msm.skill_repo._download_skills_data',
+                   side_effect=self._download):
+            old_index = self.repo.skills_meta_info
+            assert self._reload() is old_index
+
+    def test_replaced_index_stays_readable(self):
+        self.version = 0
+        with patch('msm.skill_repo._download_skills_data',
+                   side_effect=self._download_new_version):
+            old_index = self.repo.skills_meta_info
+            new_index = self._reload()
+        assert new_index is not old_index
+        assert 'https://github.com/someone/skill-new-1' in new_index
+        # Readers holding the old index aren't affected by the swap
+        assert 'https://github.com/someone/skill-new-0' in old_index
+        assert len(old_index) == 4
+
+    def test_concurrent_readers(self):
+        self.version = 0
+        url = 'https://github.com/mycroftai/skill-weather'
+        errors = []
+        done = Event()
+
+        def read():
+            try:
+                while not done.is_set():
+                    meta_info = self.repo.skills_meta_info
+                    assert meta_info.get(url) == SKILLS_DATA['skill-weather']
+            except Exception as e:
+                errors.append(e)
+
+        with patch('msm.skill_repo._download_skills_data',
+                   side_effect=self._download_new_version):
+            self.repo.skills_meta_info
+            readers = [Thread(target=read) for _ in range(4)]
+            for reader in readers:
+                reader.start()
+            for _ in range(20):
+                self._reload()
+            done.set()
+            for reader in readers:
+                reader.join()
+        assert errors == []
+
+    def test_skill_entry_reads_meta_info_on_access(self):
+        msm = Mock(repo=self.repo)
+        url = next(iter(index_skills_data(SKILLS_DATA)))
+        with patch('msm.skill_repo._download_skills_data',
+                   side_effect=self._download):
+            entry = SkillEntry('skill', '/tmp/skill', url, msm=msm)
+            # Nothing is kept on the entry
+            assert entry._meta_info is None
+            assert entry.meta_info == self.repo.skills_meta_info[url]
@@ -0,0 +1,126 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from os.path import isdir
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from msm import SkillEntry, SkillMirrorCache
+
+from helpers import TempDirTestCase, git
+
+
+class TestSkillMirrorCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = SkillMirrorCache(str(self.temp_dir.joinpath('mirrors')))
+        self.temp_dir.joinpath('mirrors').mkdir()
+        self.url = self._create_skill('skill-test')
+
+    def _create_skill(self, name):
+        skill = self.temp_dir.joinpath(name)
+        skill.mkdir()
+        git(skill, 'init', '-q', '-b', 'main')
+        skill.joinpath('__init__.py').write_text('# ' + name)
+        git(skill, 'add', '__init__.py')
+        git(skill, 'commit', '-q', '-m', 'First')
+        return str(skill)
+
+    def test_update(self):
+        mirror = self.cache.update(self.url)
+        assert mirror == self.cache.mirror_path(self.url)
+        sha = git(self.url, 'rev-parse', 'HEAD')
+        assert git(mirror, 'rev-parse', 'HEAD') == sha
+        assert git(mirror, 'symbolic-ref', 'HEAD') == 'refs/heads/main'
+
+        git(self.url, 'commit', '-q', '--allow-empty', '-m', 'Second')
+        git(self.url, 'tag', 'v2')
+        assert self.cache.update(self.url) == mirror
+        sha = git(self.url, 'rev-parse', 'HEAD')
+        assert git(mirror, 'rev-parse', 'main') == sha
+        assert git(mirror, 'rev-parse', 'v2^{commit}') == sha
+
+    def test_mirror_path(self):
+        assert self.cache.mirror_path('https://github.com/A/skill-b.git') == \
+            self.cache.mirror_path('https://github.com/a/skill-b/')
+
+    def test_invalid_url(self):
+        url = str(self.temp_dir.joinpath('missing'))
+        assert self.cache.update(url) is None
+        assert list(self.temp_dir.joinpath('mirrors').iterdir()) == []
+
+    def test_evict(self):
+        first = self.cache.update(self.url)
+        self.cache.max_size = 1
+        second = self.cache.update(self._create_skill('skill-other'))
+        assert not isdir(first)
+        assert isdir(second)
+
+    def test_install_through_mirror(self):
+        msm = Mock(mirror_cache=self.cache)
+        path = str(self.temp_dir.joinpath('skills', 'skill-test'))
+        entry = SkillEntry('skill-test', path, self.url, msm=msm)
+        entry.run_skill_requirements = Mock()
+        entry.install_system_deps = Mock()
+        entry.run_pip = Mock()
+        entry.install()
+
+        assert Path(path, '__init__.py').read_text() == '# skill-test'
+        assert git(path, 'remote', 'get-url', 'origin') == self.url
+        assert git(path, 'rev-parse', 'origin/main') == \
+            git(self.url, 'rev-parse', 'HEAD')
+        assert isdir(self.cache.mirror_path(self.url))
+
+    def test_mirror_in_use_not_evicted(self):
+        other_url = self._create_skill('skill-other')
+        with self.cache.use(self.url) as mirror:
+            self.cache.max_size = 1
+            other = self.cache.update(other_url)
+            # Both are above the limit, the one in use isn't evicted
+            assert isdir(mirror)
+            assert isdir(other)
+        self.cache.evict()
+        assert not isdir(mirror)
+
+    def test_sizes_measured_once(self):
+        self.cache.update(self.url)
+        other_url = self._create_skill('skill-other')
+        with patch('msm.mirror_cache._dir_size',
+                   return_value=10) as dir_size:
+            self.cache.update(other_url)
+            self.cache.update(self.url)
+            self.cache.evict()
+        # Only the updated mirrors are measured again
+        assert [c[0][0] for c in dir_size.call_args_list] == [
+            self.cache.mirror_path(other_url), self.cache.mirror_path(self.url)
+        ]
+
+    def test_failed_install_through_mirror_removed(self):
+        msm = Mock(mirror_cache=self.cache)
+        path = str(self.temp_dir.joinpath('skills', 'skill-test'))
+        entry = SkillEntry('skill-test', path, self.url, msm=msm)
+        entry.run_skill_requirements = Mock()
+        entry.install_system_deps = Mock(side_effect=RuntimeError)
+        with self.assertRaises(RuntimeError):
+            entry.install()
+        # The backup decorator wraps the whole install, not just the clone
+        assert not isdir(path)
+        assert not entry.is_local
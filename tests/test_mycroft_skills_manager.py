@@ -27,11 +27,17 @@ from pathlib import Path
 from shutil import copyfile, rmtree
 from unittest import TestCase
 
-from unittest.mock import call, Mock, patch
+from unittest.mock import call, Mock, patch, PropertyMock
 
-from msm import MycroftSkillsManager, AlreadyInstalled, AlreadyRemoved
-from msm.exceptions import MsmException
-from msm.skill_state import device_skill_state_hash
+from git import GitError
+
+from msm import MycroftSkillsManager, AlreadyInstalled, AlreadyRemoved, \
+    SkillEntry
+from msm.exceptions import MsmException, PipRequirementsException, \
+    SkillNotFound, SkillRequirementsException
+from msm.mycroft_skills_manager import _url_host
+from msm.skill_state import device_skill_state_hash, get_skill_state
+from msm.system_packages import SystemPackageBatch
 
 
 class TestMycroftSkillsManager(TestCase):
@@ -215,6 +221,285 @@ class TestMycroftSkillsManager(TestCase):
         self.assertIsNone(self.msm._default_skills)
         self.assertEqual(all_skills, self.msm._all_skills)
 
+    def test_skill_list_force_fetch(self):
+        """Forcing the list fetches the skills repo within its interval."""
+        self.skill_repo_mock.update.reset_mock()
+        self.msm.list(force=True)
+        self.skill_repo_mock.update.assert_called_once_with(True)
+        self.msm.list()
+        self.skill_repo_mock.update.assert_called_with(False)
+
+    def test_check_dirty_skills(self):
+        """Dirty state of all local skills is computed from one sha lookup.
+
+        The fake skills are not git checkouts so they are considered dirty.
+        """
+        self.skill_repo_mock.get_skill_shas.reset_mock()
+        dirty_skills = self.msm.check_dirty_skills()
+
+        self.assertDictEqual(
+            {'skill-foo': True, 'skill-bar': True},
+            dirty_skills
+        )
+        self.skill_repo_mock.get_skill_shas.assert_called_once_with()
+
+    def test_update_all_skips_pinned_skills(self):
+        """Skills already at the pinned sha are not updated."""
+        def matches_pinned_sha(skill):
+            return skill.name == 'skill-foo'
+
+        with patch.object(SkillEntry, 'matches_pinned_sha', autospec=True,
+                          side_effect=matches_pinned_sha):
+            with patch.object(SkillEntry, 'update', autospec=True,
+                              return_value=False) as update_mock:
+                self.msm.update_all()
+
+        updated = [c[0][0].name for c in update_mock.call_args_list]
+        self.assertListEqual(['skill-bar'], updated)
+
+    def test_check_updates(self):
+        """Only beta skills with moved remotes and outdated pinned skills."""
+        pinned = Mock(is_beta=False)
+        pinned.matches_pinned_sha.return_value = False
+        current = Mock(is_beta=False)
+        current.matches_pinned_sha.return_value = True
+        moved, unchanged, failing = Mock(), Mock(), Mock()
+        for skill in moved, unchanged, failing:
+            skill.is_beta = True
+            skill.matches_pinned_sha.return_value = False
+            skill.url = 'https://github.com/mycroftai/' + str(id(skill))
+        moved.has_remote_changes.return_value = True
+        unchanged.has_remote_changes.return_value = False
+        failing.has_remote_changes.side_effect = GitError
+
+        with_updates = self.msm.check_updates(
+            [pinned, current, moved, unchanged, failing]
+        )
+        self.assertListEqual([pinned, moved, failing], with_updates)
+        pinned.has_remote_changes.assert_not_called()
+        current.has_remote_changes.assert_not_called()
+
+    def test_url_host(self):
+        self.assertEqual('github.com',
+                         _url_host('https://github.com/mycroftai/skill-a'))
+        self.assertEqual('github.com',
+                         _url_host('git@github.com:forslund/skill-b.git'))
+
+    def test_batch_pip_failure_recorded(self):
+        """Skills whose batched requirements failed are marked as failed."""
+        self.msm.batch_pip = True
+        error = PipRequirementsException(1, '', 'No matching distribution')
+
+        def install_skill(skill):
+            # Stands in for run_pip of an install rolled back on failure
+            self.msm.pip_batch.add(skill, ['missing'], rollback=Mock())
+
+        with patch('msm.pip_batch.pip_install', side_effect=error):
+            with patch.object(SkillEntry, 'update', autospec=True,
+                              side_effect=install_skill):
+                self.msm.update_all()
+
+        self.assertIsNone(self.msm.pip_batch)
+        skill_state = get_skill_state('skill-foo',
+                                      self.msm.device_skill_state)
+        self.assertEqual('error', skill_state['status'])
+        self.assertEqual(str(error), skill_state['failure_message'])
+
+    def test_batched_system_packages_installed_before_pip(self):
+        """Pip requirements wait for the batched system packages."""
+        self.msm.batch_system_packages = True
+        calls = []
+
+        def install_skill(skill):
+            self.msm.system_package_batch.add(skill, ['libfoo'])
+            self.msm.pip_batch.add(skill, ['foo'])
+            calls.append('queued')
+
+        def run_system_packages(batch):
+            calls.append('system packages')
+            return {}
+
+        def pip_install(packages, constraints=None, wheelhouse=None):
+            calls.append('pip')
+
+        with patch('msm.pip_batch.pip_install', side_effect=pip_install), \
+                patch.object(SystemPackageBatch, 'run', autospec=True,
+                             side_effect=run_system_packages), \
+                patch.object(SkillEntry, 'update', autospec=True,
+                             side_effect=install_skill):
+            self.msm.update_all()
+
+        # Without batch_pip the requirements are installed skill by skill
+        self.assertEqual(
+            ['queued', 'queued', 'system packages', 'pip', 'pip'], calls
+        )
+
+    def _dependency_skills(self, dependencies):
+        skills = {}
+        for name, requirements in dependencies.items():
+            skill = Mock(is_local=False, is_beta=False, skill_gid=name,
+                         meta_info={'requirements': {'skill': requirements}})
+            skill.name = name
+            skills[name] = skill
+
+        def find_skill(name, author=None):
+            if name not in skills:
+                raise SkillNotFound(name)
+            return skills[name]
+
+        self.msm.find_skill = Mock(side_effect=find_skill)
+        return skills
+
+    def test_install_dependencies_first(self):
+        """Shared dependencies are installed once, before their dependents.
+        """
+        skills = self._dependency_skills({
+            'skill-a': ['skill-b', 'skill-c'],
+            'skill-b': ['skill-d'],
+            'skill-c': ['skill-d'],
+            'skill-d': []
+        })
+        installed = []
+
+        def install(name):
+            def install_skill(constraints, skill_requirements=True):
+                for dependency in skills[name].meta_info['requirements'][
+                        'skill']:
+                    self.assertIn(dependency, installed)
+                installed.append(name)
+            return install_skill
+
+        for name, skill in skills.items():
+            skill.install.side_effect = install(name)
+        self.msm.install('skill-a', origin='cli')
+
+        self.assertEqual('skill-a', installed[-1])
+        self.assertEqual(['skill-a', 'skill-b', 'skill-c', 'skill-d'],
+                         sorted(installed))
+        state = self.msm.device_skill_state
+        self.assertEqual('cli', get_skill_state('skill-a', state)['origin'])
+        self.assertEqual('', get_skill_state('skill-d', state)['origin'])
+
+    def test_circular_dependencies(self):
+        """Cycles are reported before anything is installed."""
+        skills = self._dependency_skills({
+            'skill-a': ['skill-b'],
+            'skill-b': ['skill-c'],
+            'skill-c': ['skill-a']
+        })
+        with self.assertRaises(SkillRequirementsException) as context:
+            self.msm.install('skill-a')
+        self.assertIn('skill-a -> skill-b -> skill-c -> skill-a',
+                      str(context.exception))
+        for skill in skills.values():
+            skill.install.assert_not_called()
+
+    def test_failed_dependency_skips_dependents(self):
+        skills = self._dependency_skills({
+            'skill-a': ['skill-b', 'skill-c'],
+            'skill-b': [],
+            'skill-c': []
+        })
+        skills['skill-b'].install.side_effect = MsmException('RED ALERT!')
+        with self.assertRaises(SkillRequirementsException):
+            self.msm.install('skill-a')
+        skills['skill-a'].install.assert_not_called()
+        skills['skill-c'].install.assert_called_once_with(
+            None, skill_requirements=False
+        )
+
+    def _install_from_disk(self, skills, on_disk, installed):
+        """Make installs list the dependencies of the skills on disk."""
+        def install(skill):
+            def install_skill(constraints, skill_requirements=True):
+                installed.append(skill.name)
+                skill.is_local = True
+                skill.dependent_skills = on_disk[skill.name]
+            return install_skill
+
+        for skill in skills.values():
+            skill.install.side_effect = install(skill)
+
+    def test_install_dependencies_listed_on_disk(self):
+        """Dependencies missing from the metadata are found after cloning.
+        """
+        skills = self._dependency_skills({
+            'skill-a': [],
+            'skill-b': [],
+            'skill-c': ['skill-b']
+        })
+        installed = []
+        self._install_from_disk(skills, {
+            'skill-a': ['skill-b', 'skill-c'],
+            'skill-b': [],
+            'skill-c': ['skill-b']
+        }, installed)
+        self.msm.install('skill-a', origin='cli')
+
+        self.assertEqual(['skill-a', 'skill-b', 'skill-c'], installed)
+        for skill in skills.values():
+            skill.install.assert_called_once_with(
+                None, skill_requirements=False
+            )
+        state = self.msm.device_skill_state
+        self.assertEqual('', get_skill_state('skill-c', state)['origin'])
+
+    def test_failed_dependency_on_disk_removes_dependent(self):
+        skills = self._dependency_skills({'skill-a': [], 'skill-b': []})
+        installed = []
+        self._install_from_disk(skills, {'skill-a': ['skill-b']}, installed)
+        skills['skill-b'].install.side_effect = MsmException('RED ALERT!')
+        with self.assertRaises(SkillRequirementsException):
+            self.msm.install('skill-a')
+        skills['skill-a'].remove.assert_called_once_with()
+        skill_state = get_skill_state('skill-a', self.msm.device_skill_state)
+        self.assertEqual('failed', skill_state['installation'])
+
+    def test_circular_dependencies_on_disk(self):
+        skills = self._dependency_skills({
+            'skill-a': [],
+            'skill-b': ['skill-a']
+        })
+        installed = []
+        self._install_from_disk(skills, {'skill-a': ['skill-b']}, installed)
+        with self.assertRaises(SkillRequirementsException) as context:
+            self.msm.install('skill-a')
+        self.assertIn('skill-a -> skill-b -> skill-a',
+                      str(context.exception))
+        self.assertEqual(['skill-a'], installed)
+        skills['skill-a'].remove.assert_called_once_with()
+
+    def test_install_skill_requirements(self):
+        """Dependencies of installed skills are scheduled, not recursed."""
+        skills = self._dependency_skills({
+            'skill-b': ['skill-c'],
+            'skill-c': []
+        })
+        installed = []
+        self._install_from_disk(skills, {'skill-b': [], 'skill-c': []},
+                                installed)
+        skill = Mock(is_local=True, dependent_skills=['skill-b', 'skill-c'])
+        skill.name = 'skill-a'
+        self.msm.install_skill_requirements(skill)
+        self.assertEqual(['skill-c', 'skill-b'], installed)
+
+    def test_install_defaults_results(self):
+        """Failed default skill installs are reported."""
+        skills = self._dependency_skills({
+            'skill-a': [],
+            'skill-b': ['skill-missing'],
+            'skill-c': []
+        })
+        skills['skill-a'].install.side_effect = MsmException('RED ALERT!')
+        local_skill = Mock(is_local=True)
+        local_skill.name = 'skill-local'
+        skills['skill-local'] = local_skill
+        with patch.object(MycroftSkillsManager, 'default_skills',
+                          new_callable=PropertyMock, return_value=skills), \
+                patch.object(self.msm, 'update', return_value=True):
+            results = self.msm.install_defaults()
+        self.assertEqual([False, False, None, True], results)
+
     def test_install(self):
         """Install a skill
 
@@ -246,9 +531,11 @@ class TestMycroftSkillsManager(TestCase):
         )
         self.assertIn(skill_test_state, device_skill_state['skills'])
         self.assertListEqual(
-            [call.install(None)],
+            [call.install(None, skill_requirements=False)],
             skill_to_install.method_calls
         )
+        self.assertIn('all_skills', self.msm._cache)
+        self.assertIs(skill_to_install, self.msm.local_skills['skill-test'])
 
     def test_already_installed(self):
         """Attempt install of skill already on the device.
@@ -310,7 +597,7 @@ class TestMycroftSkillsManager(TestCase):
         self.assertIn(skill_test_state, self.msm.device_skill_state['skills'])
         self.assertIn(skill_test_state, device_skill_state['skills'])
         self.assertListEqual(
-            [call.install(None)],
+            [call.install(None, skill_requirements=False)],
             skill_to_install.method_calls
         )
 
@@ -322,6 +609,7 @@ class TestMycroftSkillsManager(TestCase):
         """
         skill_to_remove = self.skill_entry_mock()
         skill_to_remove.name = 'skill-foo'
+        skill_to_remove.is_local = False
         pre_install_hash = device_skill_state_hash(
             self.msm.device_skill_state
         )
@@ -339,7 +627,9 @@ class TestMycroftSkillsManager(TestCase):
         ]
         self.assertNotIn('skill_foo', skill_names)
         self.assertListEqual([call.remove()], skill_to_remove.method_calls)
-        self.assertNotIn('all_skills', self.msm._cache)
+        # The skill list is updated without listing the skills again
+        self.assertIn('all_skills', self.msm._cache)
+        self.assertNotIn(skill_to_remove, self.msm.all_skills)
         self.assertIsNone(self.msm._local_skills)
         post_install_hash = device_skill_state_hash(
             self.msm.device_skill_state
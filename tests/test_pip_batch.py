@@ -0,0 +1,245 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
+
+from packaging.version import Version
+
+from msm import MycroftSkillsManager, SkillEntry
+from msm.exceptions import PipRequirementsException
+from msm.pip_batch import PipBatch, importlib_metadata, \
+    missing_requirements, pip_install
+
+from helpers import TempDirTestCase
+
+
+def skill_mock(name):
+    skill = Mock()
+    skill.name = name
+    return skill
+
+
+class TestPipBatch(TestCase):
+    def setUp(self):
+        patcher = patch('msm.pip_batch.pip_install')
+        self.pip_install = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.batch = PipBatch()
+        self.skill_a = skill_mock('skill-a')
+        self.skill_b = skill_mock('skill-b')
+        self.skill_c = skill_mock('skill-c')
+
+    def test_single_pip_run_per_constraints(self):
+        self.batch.add(self.skill_a, ['requests', 'pyyaml'])
+        self.batch.add(self.skill_b, ['pyyaml', 'lazy'])
+        self.batch.add(self.skill_c, ['pako'], 'constraints.txt')
+        assert self.batch.run() == {}
+        assert self.pip_install.call_args_list == [
+            call(['requests', 'pyyaml', 'lazy'], None, None),
+            call(['pako'], 'constraints.txt', None)
+        ]
+        assert len(self.batch) == 0
+
+    def test_failures_attributed_to_skills(self):
+        error = PipRequirementsException(1, '', 'No matching distribution')
+
+        def pip_install(packages, constraints=None, wheelhouse=None):
+            if 'missing' in packages:
+                raise error
+
+        self.pip_install.side_effect = pip_install
+        rollback_a, rollback_b = Mock(), Mock()
+        self.batch.add(self.skill_a, ['requests', 'missing'],
+                       rollback=rollback_a)
+        self.batch.add(self.skill_b, ['lazy'], rollback=rollback_b)
+
+        assert self.batch.run() == {self.skill_a: error}
+        assert self.pip_install.call_args_list == [
+            call(['requests', 'missing', 'lazy'], None, None),
+            call(['requests'], None, None),
+            call(['missing'], None, None),
+            call(['lazy'], None, None)
+        ]
+        rollback_a.assert_called_once_with()
+        rollback_b.assert_not_called()
+
+    def test_deferred_requirements_installed_per_skill(self):
+        batch = PipBatch(combine=False)
+        batch.add(self.skill_a, ['requests', 'pyyaml'])
+        batch.add(self.skill_b, ['lazy'])
+        batch.add(self.skill_c, ['pako'])
+        assert batch.run(skip=[self.skill_c]) == {}
+        assert self.pip_install.call_args_list == [
+            call(['requests'], None, None),
+            call(['pyyaml'], None, None),
+            call(['lazy'], None, None)
+        ]
+
+    def test_run_pip_deferred_to_batch(self):
+        msm = Mock(pip_batch=self.batch)
+        entry = SkillEntry('skill-a', 'skill-path', msm=msm)
+        entry.dependent_python_packages = ['not-installed-requirement']
+        with patch('msm.skill_entry.exists', return_value=False):
+            assert entry.run_pip()
+        self.pip_install.assert_not_called()
+        assert len(self.batch) == 1
+
+
+class TestMissingRequirements(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch('msm.pip_batch._pip_in_interpreter_dir',
+                        return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = Version(importlib_metadata.version('packaging'))
+
+    def _constraints(self, content):
+        path = self.temp_dir.joinpath('constraints.txt')
+        path.write_text(content)
+        return str(path)
+
+    def test_specifiers(self):
+        next_major = self.version.major + 1
+        packages = [
+            'packaging',
+            'Packaging>={}'.format(self.version),
+            'packaging>={}'.format(next_major),
+            'not-installed-requirement',
+            'not-installed-requirement; python_version < "3"',
+            'packaging[extra]',
+            'git+https://github.com/MycroftAI/lingua_franca.git'
+        ]
+        assert missing_requirements(packages) == [
+            'packaging>={}'.format(next_major),
+            'not-installed-requirement',
+            'packaging[extra]',
+            'git+https://github.com/MycroftAI/lingua_franca.git'
+        ]
+
+    def test_constraints(self):
+        constraints = self._constraints(
+            '# Pinned versions\npackaging<{}\n'.format(self.version)
+        )
+        assert missing_requirements(['packaging'], constraints) == \
+            ['packaging']
+        constraints = self._constraints(
+            'packaging=={}  # Current version\n'.format(self.version)
+        )
+        assert missing_requirements(['packaging'], constraints) == []
+
+    def test_unsupported_constraints(self):
+        constraints = self._constraints('-r other-constraints.txt\n')
+        assert missing_requirements(['packaging'], constraints) == \
+            ['packaging']
+        assert missing_requirements(['packaging'], 'missing.txt') == \
+            ['packaging']
+
+    def test_cached_until_environment_changes(self):
+        packages = ['packaging', 'not-installed-requirement']
+        with patch('msm.pip_batch._environment_fingerprint',
+                   return_value=('a',)):
+            assert len(missing_requirements(packages)) == 1
+            with patch.object(importlib_metadata, 'distributions') as dists:
+                assert len(missing_requirements(packages)) == 1
+            dists.assert_not_called()
+
+        with patch('msm.pip_batch._environment_fingerprint',
+                   return_value=('b',)):
+            with patch.object(importlib_metadata, 'distributions',
+                              return_value=[]):
+                assert len(missing_requirements(packages)) == 2
+
+
+class TestWheelhouse(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wheelhouse = str(self.temp_dir.joinpath('wheels'))
+        patcher = patch('msm.pip_batch._run_pip')
+        self.run_pip = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.offline = ['install', '--no-index', '--find-links',
+                        self.wheelhouse]
+        self.build = ['wheel', '--wheel-dir', self.wheelhouse,
+                      '--find-links', self.wheelhouse]
+
+    def test_without_wheelhouse(self):
+        pip_install(['requests'])
+        assert self.run_pip.call_args_list == [
+            call(['install'], ['requests'], None)
+        ]
+
+    def test_installed_from_wheelhouse(self):
+        pip_install(['requests'], 'c.txt', self.wheelhouse)
+        assert self.run_pip.call_args_list == [
+            call(self.offline, ['requests'], 'c.txt')
+        ]
+
+    def test_missing_wheels_built(self):
+        self.run_pip.side_effect = [
+            PipRequirementsException(1, '', ''), None, None
+        ]
+        pip_install(['requests'], None, self.wheelhouse)
+        assert self.run_pip.call_args_list == [
+            call(self.offline, ['requests'], None),
+            call(self.build, ['requests'], None),
+            call(self.offline, ['requests'], None)
+        ]
+        assert Path(self.wheelhouse).is_dir()
+
+    def test_unbuildable_wheels_installed_from_index(self):
+        error = PipRequirementsException(1, '', '')
+        self.run_pip.side_effect = [error, error, None]
+        pip_install(['requests'], None, self.wheelhouse)
+        assert self.run_pip.call_args_list[-1] == call(
+            ['install', '--find-links', self.wheelhouse], ['requests'], None
+        )
+
+    def test_msm_build_wheels(self):
+        skill_a = skill_mock('skill-a')
+        skill_a.dependent_python_packages = ['requests', 'lazy']
+        skill_a.meta_info = {'requirements': {'python': ['pyyaml']}}
+        skill_b = skill_mock('skill-b')
+        skill_b.dependent_python_packages = ['lazy', 'broken']
+        skill_b.meta_info = {}
+
+        def run_pip(args, packages, constraints=None):
+            if 'broken' in packages:
+                raise PipRequirementsException(1, '', '')
+
+        self.run_pip.side_effect = run_pip
+        msm = Mock(wheelhouse=self.wheelhouse,
+                   local_skills={'skill-a': skill_a, 'skill-b': skill_b},
+                   all_skills=[skill_a, skill_b])
+        with patch('msm.mycroft_skills_manager.path.exists',
+                   return_value=False):
+            assert not MycroftSkillsManager.build_wheels(msm)
+            built = [c[0][1] for c in self.run_pip.call_args_list]
+            assert built == [['requests', 'lazy', 'broken'], ['requests'],
+                             ['lazy'], ['broken']]
+
+            self.run_pip.reset_mock()
+            assert MycroftSkillsManager.build_wheels(msm, catalog=True)
+            assert self.run_pip.call_args_list == [
+                call(self.build, ['pyyaml'], None)
+            ]
@@ -0,0 +1,132 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from threading import Thread
+from unittest import TestCase
+
+from msm import SkillEntry
+from msm.skill_collection import SkillCollection
+
+
+def skill_entry(name, author='MycroftAI', is_local=False, path=None):
+    skill = SkillEntry(name, path or '/opt/mycroft/skills/' + name,
+                       'https://github.com/{}/{}'.format(author, name))
+    skill.is_local = is_local
+    return skill
+
+
+class TestSkillCollection(TestCase):
+    def setUp(self):
+        self.weather = skill_entry('mycroft-weather', is_local=True)
+        self.timer = skill_entry('mycroft-timer')
+        self.fork = skill_entry('mycroft-weather', author='someone')
+        self.skills = SkillCollection(
+            [self.weather, self.timer, self.fork],
+            remote_ids=[self.weather.id, self.timer.id]
+        )
+
+    def test_lookups(self):
+        assert self.skills == [self.weather, self.timer, self.fork]
+        assert self.skills.get_by_id('mycroftai:mycroft-timer') is \
+            self.timer
+        # Names resolve to the last skill like a dict built from the list
+        assert self.skills.get_by_name('mycroft-weather') is self.fork
+        assert self.skills.get_by_path(self.timer.path) is self.timer
+        assert self.skills.get_by_path(self.timer.path, local=True) is None
+        assert self.skills.get_by_url(
+            'https://github.com/MycroftAI/mycroft-timer.git/'
+        ) is self.timer
+        assert self.skills.get_by_name('missing') is None
+        assert self.skills.local_skills == {'mycroft-weather': self.weather}
+
+    def test_refresh_after_install_and_remove(self):
+        generation = self.skills.generation
+        self.timer.is_local = True
+        self.skills.refresh(self.timer)
+        assert self.skills.local_skills == {'mycroft-weather': self.weather,
+                                            'mycroft-timer': self.timer}
+        assert self.skills.get_by_path(self.timer.path, local=True) is \
+            self.timer
+
+        self.weather.is_local = False
+        self.skills.refresh(self.weather)
+        assert self.skills.local_skills == {'mycroft-timer': self.timer}
+        assert self.skills.generation == generation + 2
+
+    def test_add_and_discard(self):
+        new_skill = skill_entry('skill-new', is_local=True)
+        self.skills.add(new_skill)
+        assert new_skill in self.skills
+        assert self.skills.get_by_id(new_skill.id) is new_skill
+        assert self.skills.local_skills['skill-new'] is new_skill
+
+        self.skills.discard(new_skill)
+        assert new_skill not in self.skills
+        assert self.skills == [self.weather, self.timer, self.fork]
+        assert self.skills.get_by_id(new_skill.id) is None
+        assert 'skill-new' not in self.skills.local_skills
+
+    def test_local_duplicate_names(self):
+        self.fork.is_local = True
+        self.skills.refresh(self.fork)
+        assert self.skills.local_skills['mycroft-weather'] is self.fork
+        self.fork.is_local = False
+        self.skills.refresh(self.fork)
+        assert self.skills.local_skills['mycroft-weather'] is self.weather
+
+    def test_local_skills_is_copy(self):
+        local_skills = self.skills.local_skills
+        del local_skills['mycroft-weather']
+        assert self.skills.local_skills == {'mycroft-weather': self.weather}
+
+    def test_update_skill(self):
+        new_skill = skill_entry('skill-new', is_local=True)
+        self.skills.update_skill(new_skill)
+        assert new_skill in self.skills
+        # Removed skills missing from the skills repo are dropped
+        new_skill.is_local = False
+        self.skills.update_skill(new_skill)
+        assert new_skill not in self.skills
+        self.weather.is_local = False
+        self.skills.update_skill(self.weather)
+        assert self.weather in self.skills
+        assert self.skills.local_skills == {}
+
+    def test_concurrent_changes(self):
+        new_skills = [skill_entry('skill-{}'.format(i), is_local=True)
+                      for i in range(50)]
+
+        def add_and_discard(skills):
+            for skill in skills:
+                self.skills.add(skill)
+                self.skills.local_skills
+            for skill in skills:
+                self.skills.discard(skill)
+
+        threads = [Thread(target=add_and_discard, args=(new_skills[i::5],))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert self.skills == [self.weather, self.timer, self.fork]
+        assert self.skills.local_skills == {'mycroft-weather': self.weather}
+        assert self.skills.generation == 100
@@ -19,10 +19,18 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+from pathlib import Path
+from shutil import rmtree
+from unittest.mock import Mock, patch
+
 import pytest
 from os.path import exists, join, dirname, abspath
 
-from msm import SkillEntry
+from msm import AlreadyInstalled, SkillEntry, SkillModified
+from msm.skill_entry import _backup_previous_version
+from msm.util import is_shallow_clone
+
+from helpers import SkillSourceTestCase, git
 
 
 class TestSkillEntry(object):
@@ -99,3 +107,162 @@ class TestSkillEntry(object):
 
     def test_repr(self):
         str(self.entry)
+
+
+class TestShallowInstall(SkillSourceTestCase):
+    def setUp(self):
+        super().setUp()
+        git(self.source, 'config', 'uploadpack.allowReachableSHA1InWant',
+            'true')
+        self.shas = [self._commit(str(i)) for i in range(3)]
+        self.url = self.source.as_uri()
+        self.path = str(self.temp_dir.joinpath('skills', 'skill-test'))
+
+    def _entry(self, sha):
+        entry = SkillEntry('skill-test', self.path, self.url, sha,
+                           msm=Mock(mirror_cache=None, shallow_installs=True))
+        entry.run_skill_requirements = Mock()
+        entry.install_system_deps = Mock()
+        entry.run_pip = Mock()
+        entry.update_deps = Mock()
+        return entry
+
+    def _commit_count(self):
+        return int(git(self.path, 'rev-list', '--count', '--all'))
+
+    def test_install_pinned_sha(self):
+        self._entry(self.shas[1]).install()
+        assert git(self.path, 'rev-parse', 'HEAD') == self.shas[1]
+        assert Path(self.path, '__init__.py').read_text() == '1'
+        assert is_shallow_clone(self.path)
+        assert self._commit_count() == 2  # Pinned commit and branch tip
+
+    def test_install_beta(self):
+        self._entry('').install()
+        assert git(self.path, 'rev-parse', 'HEAD') == self.shas[2]
+        assert self._commit_count() == 1
+
+    def test_update_deepens_when_needed(self):
+        self._entry(self.shas[1]).install()
+        git(self.source, 'checkout', '-q', '-b', 'other', self.shas[0])
+        other_sha = self._commit('other')
+
+        entry = self._entry(other_sha)
+        entry.is_local = True
+        assert entry.update()
+        assert git(self.path, 'rev-parse', 'HEAD') == other_sha
+        assert not is_shallow_clone(self.path)
+
+
+class TestBackupPreviousVersion(SkillSourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shas = [self._commit(str(i)) for i in range(2)]
+        self.path = self.temp_dir.joinpath('skills', 'skill-test')
+        git(self.temp_dir, 'clone', '-q', str(self.source), str(self.path))
+        git(self.path, 'reset', '-q', '--hard', self.shas[0])
+        self.entry = SkillEntry('skill-test', str(self.path),
+                                str(self.source), self.shas[1])
+        self.entry.is_local = True
+
+    def test_failed_update_rolled_back(self):
+        self.entry.update_deps = Mock(side_effect=RuntimeError)
+        with pytest.raises(RuntimeError):
+            self.entry.update()
+        assert git(self.path, 'rev-parse', 'HEAD') == self.shas[0]
+        assert git(self.path, 'symbolic-ref', 'HEAD') == 'refs/heads/master'
+        assert self.path.joinpath('__init__.py').read_text() == '0'
+        assert self.entry.is_local
+
+    def test_update_result_returned(self):
+        self.entry.update_deps = Mock()
+        assert self.entry.update() is True
+        assert self.entry.update() is False
+
+    def test_update_at_pinned_sha_skips_git(self):
+        self.entry.sha = self.shas[0]
+        with patch('msm.skill_entry.Git') as git_mock:
+            assert self.entry.update() is False
+        git_mock.assert_not_called()
+
+    def test_folder_without_git_restored(self):
+        rmtree(str(self.path.joinpath('.git')))
+
+        @_backup_previous_version
+        def modify(entry):
+            Path(entry.path, '__init__.py').write_text('modified')
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            modify(self.entry)
+        assert self.path.joinpath('__init__.py').read_text() == '0'
+        assert not Path(self.entry.old_path).parent.exists()
+
+    def test_installed_skill_keeps_local_changes(self):
+        self.path.joinpath('__init__.py').write_text('edited')
+        with pytest.raises(AlreadyInstalled):
+            self.entry.install()
+        assert self.path.joinpath('__init__.py').read_text() == 'edited'
+
+    def test_refused_actions_make_no_backup(self):
+        """Installed or modified skills are refused before backing up."""
+        rmtree(str(self.path.joinpath('.git')))
+        with patch('msm.skill_entry._git_snapshot') as snapshot, \
+                patch('msm.skill_entry._backup_copy') as backup_copy:
+            with pytest.raises(AlreadyInstalled):
+                self.entry.install()
+        snapshot.assert_not_called()
+        backup_copy.assert_not_called()
+
+    def test_modified_skill_update_makes_no_backup(self):
+        self.path.joinpath('__init__.py').write_text('edited')
+        with patch('msm.skill_entry._backup_copy') as backup_copy:
+            with pytest.raises(SkillModified):
+                self.entry.update()
+        backup_copy.assert_not_called()
+        assert self.path.joinpath('__init__.py').read_text() == 'edited'
+
+    def test_failed_action_keeps_local_changes(self):
+        self.path.joinpath('__init__.py').write_text('edited')
+
+        @_backup_previous_version
+        def modify(entry):
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            modify(self.entry)
+        assert self.path.joinpath('__init__.py').read_text() == 'edited'
+        assert git(self.path, 'rev-parse', 'HEAD') == self.shas[0]
+
+    def test_failed_install_removed(self):
+        rmtree(str(self.path))
+        self.entry.is_local = False
+        self.entry.run_pip = Mock(side_effect=RuntimeError)
+        self.entry.install_system_deps = Mock()
+        with pytest.raises(RuntimeError):
+            self.entry.install()
+        assert not self.path.exists()
+        assert not self.entry.is_local
+
+
+class TestHasRemoteChanges(SkillSourceTestCase):
+    def setUp(self):
+        super().setUp()
+        git(self.source, 'commit', '-q', '--allow-empty', '-m', 'First')
+        self.path = self.temp_dir.joinpath('skill-clone')
+        git(self.temp_dir, 'clone', '-q', str(self.source), str(self.path))
+        self.entry = SkillEntry('skill-test', str(self.path),
+                                str(self.source))
+        self.entry.is_local = True
+
+    def test_unchanged(self):
+        assert not self.entry.has_remote_changes()
+
+    def test_remote_moved(self):
+        git(self.source, 'commit', '-q', '--allow-empty', '-m', 'Second')
+        assert self.entry.has_remote_changes()
+
+    def test_fetched_but_not_merged(self):
+        git(self.source, 'commit', '-q', '--allow-empty', '-m', 'Second')
+        git(self.path, 'fetch', '-q')
+        assert self.entry.has_remote_changes()
@@ -19,10 +19,49 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from os import chdir
-from os.path import abspath, dirname
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import chdir, listdir
+from os.path import abspath, dirname, join
+from threading import Event, Thread
+from unittest.mock import patch
+
+from git import GitCommandError, Repo
+from msm.util import Git
 
 from msm import SkillRepo
+from msm.exceptions import MsmException
+from msm.skill_repo import download_skills_data, load_skills_data
+
+from helpers import TempDirTestCase, git
+
+SKILL_A_SHA = 'a45e9b476884cfa463a50158d1131e02da072634'
+SKILL_B_SHA = '880c2f90310844f62728e762f0a2fad328c0a008'
+
+
+def create_catalog_repo(path, branch='test-branch'):
+    """Create a local stand-in for the mycroft-skills repo."""
+    path.mkdir(parents=True)
+    git(path, 'init', '-q')
+    path.joinpath('.gitmodules').write_text(
+        '[submodule "skill-a"]\n'
+        '\tpath = skill-a\n'
+        '\turl = https://github.com/MycroftAI/skill-hello-world\n'
+        '[submodule "skill-b"]\n'
+        '\tpath = skill-b\n'
+        '\turl = https://github.com/MycroftAI/skill-ip.git\n'
+    )
+    path.joinpath('DEFAULT-SKILLS').write_text('# comment\nskill-a\n')
+    path.joinpath('DEFAULT-SKILLS.platform-1').write_text('skill-b\n')
+    path.joinpath('test_file.txt').write_text('test')
+    git(path, 'add', '.')
+    git(path, 'update-index', '--add', '--cacheinfo',
+        '160000,{},skill-a'.format(SKILL_A_SHA))
+    git(path, 'update-index', '--add', '--cacheinfo',
+        '160000,{},skill-b'.format(SKILL_B_SHA))
+    git(path, 'commit', '-q', '-m', 'Initial catalog')
+    git(path, 'checkout', '-q', '-b', branch)
+    return path
 
 
 class TestSkillRepo(object):
@@ -75,3 +114,309 @@ class TestSkillRepo(object):
             'default': ['skill-a'],
             'platform-1': ['skill-b']
         }
+
+
+class TestSkillRepoIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.catalog = create_catalog_repo(self.temp_dir.joinpath('catalog'))
+        self.repo = self._create_repo()
+        self.repo.update()
+
+    def _create_repo(self):
+        repo = SkillRepo(str(self.catalog), 'test-branch')
+        repo.path = str(self.temp_dir.joinpath('data', 'skills-repo'))
+        return repo
+
+    def test_get_skill_data(self):
+        assert set(self.repo.get_skill_data()) == {
+            ('skill-a', 'skill-a',
+             'https://github.com/MycroftAI/skill-hello-world', SKILL_A_SHA),
+            ('skill-b', 'skill-b',
+             'https://github.com/MycroftAI/skill-ip.git', SKILL_B_SHA)
+        }
+
+    def test_skill_data_parsed_once_per_commit(self):
+        first = list(self.repo.get_skill_data())
+        with patch.object(SkillRepo, '_parse_skill_data') as parse_mock:
+            assert list(self.repo.get_skill_data()) == first
+            # A new instance reuses the on-disk index
+            assert list(self._create_repo().get_skill_data()) == first
+        parse_mock.assert_not_called()
+
+    def test_read_file(self):
+        assert self.repo.read_file('test_file.txt') == 'test'
+        with self.assertRaises(FileNotFoundError):
+            self.repo.read_file('missing_file.txt')
+
+    def test_catalog_read_without_checkout(self):
+        assert listdir(self.repo.path) == ['.git']
+        with patch('msm.skill_repo.Git', wraps=Git) as git_mock:
+            list(self._create_repo().get_skill_data())
+            dict(self.repo.get_default_skill_names())
+        # One persistent reader per SkillRepo serves all reads
+        assert git_mock.call_count == 2
+
+    def test_invalid_branch(self):
+        repo = self._create_repo()
+        repo.branch = 'no-such-branch'
+        with self.assertRaises(MsmException):
+            repo.update()
+
+    def test_get_skill_shas(self):
+        skill_shas = self.repo.get_skill_shas()
+        assert skill_shas == {'skill-a': SKILL_A_SHA, 'skill-b': SKILL_B_SHA}
+        assert self.repo.get_skill_shas() is skill_shas
+
+    def test_skill_index_rebuilt_on_new_commit(self):
+        list(self.repo.get_skill_data())
+        git(self.catalog, 'rm', '-q', '--cached', 'skill-b')
+        git(self.catalog, 'commit', '-q', '-m', 'Remove skill-b')
+        self.repo.update(force=True)
+        skill_shas = {name: sha
+                      for name, _, _, sha in self.repo.get_skill_data()}
+        assert skill_shas == {'skill-a': SKILL_A_SHA, 'skill-b': ''}
+        index_path = join(dirname(self.repo.path), 'skills-repo-index.json')
+        assert self.repo.skill_index_path == index_path
+
+    def _commit_catalog_change(self):
+        git(self.catalog, 'commit', '-q', '--allow-empty', '-m', 'Change')
+        return git(self.catalog, 'rev-parse', 'HEAD').strip()
+
+    def test_update_throttled(self):
+        commit = self.repo.get_catalog_commit()
+        self._commit_catalog_change()
+        self.repo.update()
+        self._create_repo().update()
+        assert self.repo.get_catalog_commit() == commit
+
+    def test_update_forced(self):
+        new_commit = self._commit_catalog_change()
+        self.repo.update(force=True)
+        assert self.repo.get_catalog_commit() == new_commit
+
+    def test_update_after_fetch_interval(self):
+        new_commit = self._commit_catalog_change()
+        self.repo.fetch_interval = 0
+        self.repo.update()
+        assert self.repo.get_catalog_commit() == new_commit
+
+    def test_update_on_branch_change(self):
+        git(self.catalog, 'checkout', '-q', '-b', 'other-branch')
+        new_commit = self._commit_catalog_change()
+        self.repo.branch = 'other-branch'
+        self.repo.update()
+        assert self.repo.get_catalog_commit() == new_commit
+
+
+class TestSkillRepoPartialClone(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.catalog = create_catalog_repo(self.temp_dir.joinpath('catalog'))
+        git(self.catalog, 'config', 'uploadpack.allowFilter', 'true')
+        git(self.catalog, 'commit', '-q', '--allow-empty', '-m', 'Second')
+        self.repo = SkillRepo('file://' + str(self.catalog), 'test-branch')
+        self.repo.path = str(self.temp_dir.joinpath('data', 'skills-repo'))
+
+    def test_partial_clone(self):
+        self.repo.update()
+        repo_git = self.temp_dir.joinpath('data', 'skills-repo', '.git')
+        assert repo_git.joinpath('shallow').exists()
+        assert git(repo_git.parent, 'config',
+                   'remote.origin.partialclonefilter').startswith('blob:limit')
+        assert dict(self.repo.get_default_skill_names()) == {
+            'default': ['skill-a'],
+            'platform-1': ['skill-b']
+        }
+
+    def test_full_clone_fallback(self):
+        clone_from = Repo.clone_from
+
+        def clone_without_filter(url, path, **kwargs):
+            if 'filter' in kwargs:
+                raise GitCommandError('clone', 128)
+            return clone_from(url, path, **kwargs)
+
+        with patch('msm.skill_repo.Repo.clone_from',
+                   side_effect=clone_without_filter) as clone_mock:
+            self.repo.update()
+        assert clone_mock.call_count == 2
+        assert clone_mock.call_args == ((self.repo.url, self.repo.path),
+                                        {'no_checkout': True})
+        assert len(self.repo.get_skill_shas()) == 2
+
+    def test_partial_clone_disabled(self):
+        self.repo.partial_clone = False
+        self.repo.update()
+        repo_git = self.temp_dir.joinpath('data', 'skills-repo', '.git')
+        assert not repo_git.joinpath('shallow').exists()
+
+
+class SkillsDataServer(HTTPServer):
+    """Local stand-in for the skills data host counting its traffic."""
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SkillsDataHandler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server_port)
+        self.set_data({'skill-a': {'repo': 'https://github.com/A/Skill-A'}})
+        self.use_etag = True
+        self.requests = []
+        self.bytes_sent = 0
+
+    def set_data(self, data):
+        self.body = json.dumps(data).encode()
+        self.etag = '"{}"'.format(hash(self.body))
+        self.last_modified = 'Wed, 1{} Oct 2026 10:00:00 GMT'.format(
+            len(self.body) % 10
+        )
+
+
+class SkillsDataHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if server.use_etag:
+            not_modified = self.headers.get('If-None-Match') == server.etag
+        else:
+            not_modified = (self.headers.get('If-Modified-Since') ==
+                            server.last_modified)
+        if not_modified:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if server.use_etag:
+            self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+        server.bytes_sent += len(server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadSkillsData(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_path = str(self.temp_dir.joinpath('skills-meta.json'))
+        self.server = SkillsDataServer()
+        Thread(target=self.server.serve_forever, daemon=True,
+               kwargs={'poll_interval': 0.05}).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url_patch = patch('msm.skill_repo.MYCROFT_SKILLS_DATA',
+                          self.server.url)
+        url_patch.start()
+        self.addCleanup(url_patch.stop)
+
+    def test_first_download(self):
+        info = download_skills_data('21.02', self.cache_path)
+        assert info == json.loads(self.server.body.decode())
+        assert len(self.server.requests) == 1
+        path, headers = self.server.requests[0]
+        assert path == '/21.02/skill-metadata.json'
+        assert 'If-None-Match' not in headers
+        assert self.server.bytes_sent == len(self.server.body)
+        with open(self.cache_path, 'rb') as f:
+            assert f.read() == self.server.body
+
+    def test_not_modified_uses_cache(self):
+        first = download_skills_data('21.02', self.cache_path)
+        second = download_skills_data('21.02', self.cache_path)
+        assert second == first
+        assert len(self.server.requests) == 2
+        assert self.server.requests[1][1]['If-None-Match'] == \
+            self.server.etag
+        assert self.server.bytes_sent == len(self.server.body)
+
+    def test_last_modified_validator(self):
+        self.server.use_etag = False
+        first = download_skills_data('21.02', self.cache_path)
+        assert download_skills_data('21.02', self.cache_path) == first
+        headers = self.server.requests[1][1]
+        assert 'If-None-Match' not in headers
+        assert headers['If-Modified-Since'] == self.server.last_modified
+        assert self.server.bytes_sent == len(self.server.body)
+
+    def test_modified_data_is_downloaded(self):
+        download_skills_data('21.02', self.cache_path)
+        old_size = len(self.server.body)
+        new_data = {'skill-b': {'repo': 'https://github.com/B/skill-b'}}
+        self.server.set_data(new_data)
+        assert download_skills_data('21.02', self.cache_path) == new_data
+        assert self.server.bytes_sent == old_size + len(self.server.body)
+
+    def test_validators_are_per_branch(self):
+        download_skills_data('21.02', self.cache_path)
+        download_skills_data('master', self.cache_path)
+        assert 'If-None-Match' not in self.server.requests[1][1]
+
+    def test_unreadable_cache_is_refetched(self):
+        download_skills_data('21.02', self.cache_path)
+        with open(self.cache_path, 'w') as f:
+            f.write('{broken')
+        info = download_skills_data('21.02', self.cache_path)
+        assert info == json.loads(self.server.body.decode())
+        assert len(self.server.requests) == 3
+        assert 'If-None-Match' not in self.server.requests[2][1]
+
+    def test_offline_falls_back_to_cache(self):
+        download_skills_data('21.02', self.cache_path)
+        self.server.shutdown()
+        self.server.server_close()
+        assert load_skills_data('21.02', self.cache_path) == {
+            'https://github.com/a/skill-a': {
+                'repo': 'https://github.com/A/Skill-A'
+            }
+        }
+
+
+class TestStaleWhileRevalidate(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = SkillRepo(stale_while_revalidate=True)
+        self.repo.path = str(self.temp_dir.joinpath('skills-repo'))
+        self.cached = {'skill-a': {'repo': 'https://github.com/A/skill-a'}}
+        self.fresh = {'skill-b': {'repo': 'https://github.com/B/skill-b'}}
+        self.release = Event()
+        download_patch = patch('msm.skill_repo.download_skills_data',
+                               side_effect=self._download)
+        self.download_mock = download_patch.start()
+        self.addCleanup(download_patch.stop)
+        self.addCleanup(self.release.set)
+
+    def _download(self, branch, path):
+        self.release.wait(5)
+        return self.fresh
+
+    def _write_cache(self):
+        with open(self.repo.skills_meta_cache, 'w') as f:
+            json.dump(self.cached, f)
+
+    def test_answers_from_cache_while_refreshing(self):
+        self._write_cache()
+        assert self.repo.skills_meta_info == {
+            'https://github.com/a/skill-a': self.cached['skill-a']
+        }
+        thread = self.repo.refresh_skills_meta_info()
+        assert thread.is_alive()
+        self.release.set()
+        thread.join(5)
+        assert self.repo.skills_meta_info == {
+            'https://github.com/b/skill-b': self.fresh['skill-b']
+        }
+
+    def test_single_flight_refresh(self):
+        self.repo.skills_meta_info
+        first = self.repo.refresh_skills_meta_info()
+        assert self.repo.refresh_skills_meta_info() is first
+        self.release.set()
+        first.join(5)
+        assert self.download_mock.call_count == 1
+
+    def test_no_cache_does_not_block(self):
+        assert self.repo.skills_meta_info == {}
+        self.release.set()
+        self.repo.refresh_skills_meta_info().join(5)
+        assert 'https://github.com/b/skill-b' in self.repo.skills_meta_info
@@ -0,0 +1,211 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from unittest import TestCase
+from unittest.mock import Mock
+
+from msm import MultipleSkillMatches, SkillEntry, SkillNotFound
+from msm.mycroft_skills_manager import MycroftSkillsManager
+from msm.skill_search import SkillSearchIndex
+from msm.util import LruCache
+
+SKILL_NAMES = [
+    ('mycroft-weather', 'MycroftAI'), ('skill-weather', 'someone'),
+    ('mycroft-timer', 'MycroftAI'), ('skill-timer-plus', 'forslund'),
+    ('mycroft-alarm', 'MycroftAI'), ('fallback-wolfram-alpha', 'MycroftAI'),
+    ('fallback-unknown', 'MycroftAI'), ('skill-cocktails', 'forslund'),
+    ('mycroft-npr-news', 'MycroftAI'), ('skill-news', 'someone'),
+    ('skill-homeassistant', 'btotharye'), ('mycroft-volume', 'MycroftAI'),
+    ('skill-spotify', 'forslund'), ('mycroft-spelling', 'MycroftAI'),
+    ('skill-wiki', 'someone'), ('mycroft-wiki', 'MycroftAI'),
+] + [('skill-generated-{}'.format(i), 'someone') for i in range(50)]
+
+QUERIES = [
+    'weather', 'mycroft weather', 'timer', 'timer plus', 'alarm', 'wolfram',
+    'wolfram alpha', 'fallback', 'cocktails', 'cocktail', 'news', 'npr',
+    'home assistant', 'volume', 'spotify', 'spelling', 'wiki', 'skill',
+    'generated 12', 'generated', 'xyz', 'a', 'mycroft-weather'
+]
+
+
+def skill_list():
+    return [
+        SkillEntry(name, '/opt/mycroft/skills/' + name,
+                   'https://github.com/{}/{}'.format(author, name))
+        for name, author in SKILL_NAMES
+    ]
+
+
+def msm_mock(skills):
+    msm = Mock(all_skills=skills, _search_index=None,
+               _find_skill_cache=LruCache())
+    msm._best_match = MycroftSkillsManager._best_match
+    msm._get_search_index = lambda: \
+        MycroftSkillsManager._get_search_index(msm)
+    return msm
+
+
+def find_result(func):
+    try:
+        return func()
+    except MultipleSkillMatches as e:
+        return 'multiple', [skill.name for skill in e.skills]
+    except SkillNotFound:
+        return 'not found'
+
+
+class TestSkillSearchIndex(TestCase):
+    def setUp(self):
+        self.skills = skill_list()
+        self.index = SkillSearchIndex(self.skills)
+
+    def test_scores_match_skill_entry(self):
+        for query in QUERIES:
+            for author in [None, 'MycroftAI', 'forslund']:
+                results = self.index.match_all(query, author)
+                assert [(skill, score) for skill, score in results] == [
+                    (skill, skill.match(query, author))
+                    for skill in self.skills
+                ]
+
+    def test_pruned_results_keep_matching_skills(self):
+        for query in QUERIES:
+            for author in [None, 'MycroftAI']:
+                results = dict(self.index.match_all(query, author,
+                                                    min_score=0.3))
+                for skill in self.skills:
+                    score = skill.match(query, author)
+                    if score >= 0.3:
+                        assert results[skill] == score
+                    else:
+                        assert results.get(skill, score) == score
+
+    def test_find_skill_matches_brute_force(self):
+        msm = msm_mock(self.skills)
+        for query in QUERIES:
+            for author in [None, 'MycroftAI', 'forslund']:
+                indexed = find_result(lambda: MycroftSkillsManager.find_skill(
+                    msm, query, author
+                ))
+                brute_force = find_result(
+                    lambda: MycroftSkillsManager.find_skill(
+                        msm, query, author, skills=self.skills
+                    )
+                )
+                assert indexed == brute_force, query
+
+    def test_search_matches_brute_force(self):
+        msm = msm_mock(self.skills)
+        for query in QUERIES:
+            assert MycroftSkillsManager.search(msm, query) == [
+                skill for skill in self.skills if skill.match(query) >= 0.3
+            ]
+
+    def test_index_rebuilt_for_new_skill_list(self):
+        msm = msm_mock(self.skills)
+        index = MycroftSkillsManager._get_search_index(msm)
+        assert MycroftSkillsManager._get_search_index(msm) is index
+        msm.all_skills = skill_list()
+        assert MycroftSkillsManager._get_search_index(msm) is not index
+
+    def test_cached_results_match_uncached(self):
+        msm = msm_mock(self.skills)
+        for query in QUERIES:
+            for author in [None, 'MycroftAI']:
+                uncached = find_result(lambda: MycroftSkillsManager.find_skill(
+                    msm, query, author, skills=self.skills
+                ))
+                for _ in range(2):
+                    cached = find_result(
+                        lambda: MycroftSkillsManager.find_skill(msm, query,
+                                                                author)
+                    )
+                    assert cached == uncached, query
+        cache = msm._find_skill_cache
+        assert cache.misses == len(QUERIES) * 2
+        assert cache.hits == len(QUERIES) * 2
+
+    def test_cached_exceptions_are_raised_again(self):
+        msm = msm_mock(self.skills)
+        for _ in range(2):
+            with self.assertRaises(SkillNotFound):
+                MycroftSkillsManager.find_skill(msm, 'xyz')
+            with self.assertRaises(MultipleSkillMatches) as context:
+                MycroftSkillsManager.find_skill(msm, 'wiki')
+            assert [skill.name for skill in context.exception.skills] == \
+                ['skill-wiki', 'mycroft-wiki']
+        assert msm._find_skill_cache.hits == 2
+
+    def test_cache_cleared_for_new_skill_list(self):
+        msm = msm_mock(self.skills)
+        weather = MycroftSkillsManager.find_skill(msm, 'mycroft-weather')
+        assert weather is self.skills[0]
+        msm.all_skills = skill_list()
+        assert MycroftSkillsManager.find_skill(msm, 'mycroft-weather') is \
+            msm.all_skills[0]
+        assert msm._find_skill_cache.hits == 0
+
+
+def reference_match(skill, query, author=None):
+    """Score of a skill computed without any of the cached tokens."""
+    search, search_tokens, search_common = SkillEntry._extract_tokens(
+        query, ['skill', 'fallback', 'mycroft']
+    )
+    name, _, name_common = SkillEntry._extract_tokens(
+        skill.name, ['skill', 'fallback', 'mycroft']
+    )
+    return SkillEntry._combine_match_ratios(
+        SkillEntry._compare(name, search),
+        SkillEntry._compare(name.split(' '), search_tokens),
+        SkillEntry._compare(name_common, search_common),
+        SkillEntry._compare(skill.author, author) if author else None
+    )
+
+
+class TestMatchMany(TestCase):
+    def setUp(self):
+        self.skills = skill_list()
+
+    def test_scores_match_reference(self):
+        for query in QUERIES:
+            for author in [None, 'MycroftAI']:
+                expected = [reference_match(skill, query, author)
+                            for skill in self.skills]
+                assert SkillEntry.match_many(query, author,
+                                             self.skills) == expected
+                assert [skill.match(query, author)
+                        for skill in self.skills] == expected
+
+    def test_match_tokens_follow_name(self):
+        skill = self.skills[0]
+        assert skill.match_tokens == ('weather', ['weather'], ['mycroft'])
+        skill.name = 'fallback-wolfram-alpha'
+        assert skill.match_tokens == ('wolfram alpha', ['wolfram', 'alpha'],
+                                      ['fallback'])
+
+    def test_match_top(self):
+        for query in QUERIES:
+            scores = SkillEntry.match_many(query, None, self.skills)
+            ranked = sorted(zip(self.skills, scores),
+                            key=lambda item: item[1], reverse=True)
+            assert SkillEntry.match_top(query, None, self.skills, 5) == \
+                ranked[:5]
+        assert SkillEntry.match_top('weather', None, [], 5) == []
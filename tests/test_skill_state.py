@@ -0,0 +1,94 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import copy
+import json
+import pickle
+from unittest import TestCase
+
+from msm.skill_state import (
+    DeviceSkillState,
+    SkillStateList,
+    get_skill_state,
+    initialize_skill_state
+)
+
+
+def skill_state(name, **kwargs):
+    state = initialize_skill_state(name, 'cli', False, '@|' + name)
+    state.update(kwargs)
+    return state
+
+
+class TestDeviceSkillState(TestCase):
+    def setUp(self):
+        self.data = {
+            'blacklist': [],
+            'version': 2,
+            'skills': [skill_state('skill-foo'), skill_state('skill-bar'),
+                       skill_state('skill-foo', status='error')]
+        }
+        self.state = DeviceSkillState(json.loads(json.dumps(self.data)))
+
+    def test_serializes_like_plain_dict(self):
+        assert isinstance(self.state['skills'], SkillStateList)
+        assert json.dumps(self.state, indent=4, separators=(',', ':')) == \
+            json.dumps(self.data, indent=4, separators=(',', ':'))
+        assert self.state == self.data
+
+    def test_get_skill_state_matches_linear_scan(self):
+        for name in ['skill-foo', 'skill-bar', 'skill-missing']:
+            assert get_skill_state(name, self.state) == \
+                get_skill_state(name, self.data)
+        assert get_skill_state('skill-foo', self.state)['status'] == 'error'
+        assert get_skill_state('skill-foo', self.state) is \
+            self.state['skills'][2]
+
+    def test_index_follows_changes(self):
+        skills = self.state['skills']
+        skills.append(skill_state('skill-new'))
+        assert skills.find('skill-new') is skills[-1]
+
+        skills.remove_entries(skills.find_all('skill-foo'))
+        assert [s['name'] for s in skills] == ['skill-bar', 'skill-new']
+        assert skills.find('skill-foo') is None
+
+        del skills[0]
+        assert skills.find('skill-bar') is None
+        skills.insert(0, skill_state('skill-bar'))
+        assert skills.find('skill-bar') is skills[0]
+
+    def test_replaced_skill_list_is_indexed(self):
+        self.state['skills'] = [skill_state('skill-baz')]
+        assert get_skill_state('skill-baz', self.state)['name'] == \
+            'skill-baz'
+        self.state.update(skills=[])
+        assert get_skill_state('skill-baz', self.state) == {}
+
+    def test_copies_rebuild_index(self):
+        copies = [copy.copy(self.state), copy.deepcopy(self.state),
+                  pickle.loads(pickle.dumps(self.state))]
+        for state in copies:
+            skills = state['skills']
+            assert isinstance(skills, SkillStateList)
+            assert state == self.data
+            assert len(skills.find_all('skill-foo')) == 2
+            assert skills.find('skill-foo') is skills[2]
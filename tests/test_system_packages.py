@@ -0,0 +1,141 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from msm.system_packages import SystemPackageBatch, _parse_query_output
+
+
+def skill_mock(name):
+    skill = Mock()
+    skill.name = name
+    return skill
+
+
+class TestParseQueryOutput(TestCase):
+    def test_dpkg_query(self):
+        output = 'ii  mpg123\nun  portaudio19-dev\nii  other\n'
+        assert _parse_query_output(
+            'apt-get', output, ['mpg123', 'portaudio19-dev']
+        ) == {'mpg123'}
+
+    def test_rpm(self):
+        output = 'mpg123\npackage portaudio-devel is not installed\n'
+        assert _parse_query_output(
+            'dnf', output, ['mpg123', 'portaudio-devel']
+        ) == {'mpg123'}
+
+
+class TestSystemPackageBatch(TestCase):
+    def setUp(self):
+        self.manager = Mock(config={'formats': {'exe': ['{}', '{}-utils']}})
+        self.manager.name = 'apt-get'
+        self.manager.install.return_value = True
+        patcher = patch('msm.system_packages.PakoManager',
+                        return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('msm.system_packages.installed_packages',
+                        return_value={'mpg123', 'vlc-utils'})
+        self.installed_packages = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.batch = SystemPackageBatch()
+
+    def test_single_install_of_missing_packages(self):
+        self.batch.add(skill_mock('skill-a'), ['mpg123', 'portaudio'],
+                       {'apt-get': ['mpg123', 'portaudio19-dev']})
+        self.batch.add(skill_mock('skill-b'), ['portaudio', 'flac'],
+                       {'apt-get': ['portaudio19-dev', 'flac']})
+        self.batch.add(skill_mock('skill-c'), ['vlc', 'sox'])
+        self.batch.add(skill_mock('skill-d'), [], {'apt-get': ['ignored']})
+        with patch('msm.system_packages.shutil.which'):
+            assert self.batch.run() == {}
+
+        self.installed_packages.assert_called_once_with(
+            'apt-get', ['mpg123', 'portaudio19-dev', 'flac',
+                        'vlc', 'vlc-utils', 'sox', 'sox-utils']
+        )
+        assert self.manager.install.call_count == 2
+        self.manager.install.assert_any_call(
+            [], overrides={'apt-get': ['portaudio19-dev', 'flac']},
+            flags=['no-confirm']
+        )
+        # Generic names are resolved and installed in one transaction too
+        self.manager.install.assert_any_call(
+            [], overrides={'apt-get': ['sox']}, flags=['no-confirm']
+        )
+
+    def test_failed_generic_package_doesnt_stop_others(self):
+        self.manager.install.return_value = False
+        self.manager.install_one.side_effect = \
+            lambda package, flags: package != 'broken'
+        self.batch.add(skill_mock('skill-a'), ['broken', 'sox'])
+        self.batch.add(skill_mock('skill-b'), ['flac'])
+        with patch('msm.system_packages.shutil.which'), \
+                patch('msm.system_packages.LOG') as log:
+            assert self.batch.run() == {}
+
+        self.manager.install.assert_called_once_with(
+            [], overrides={'apt-get': ['broken', 'sox', 'flac']},
+            flags=['no-confirm']
+        )
+        assert [c[0][0] for c in self.manager.install_one.call_args_list] \
+            == ['broken', 'sox', 'flac']
+        log.warning.assert_called_once_with(
+            'Failed to install system packages of skill-a: broken'
+        )
+
+    def test_failed_specific_names_installed_one_by_one(self):
+        self.manager.install.side_effect = \
+            lambda packages, overrides, flags: \
+            'broken' not in overrides['apt-get']
+        self.batch.add(skill_mock('skill-a'), ['x'], {'apt-get': ['broken']})
+        self.batch.add(skill_mock('skill-b'), ['y'], {'apt-get': ['flac']})
+        with patch('msm.system_packages.shutil.which'), \
+                patch('msm.system_packages.LOG') as log:
+            assert self.batch.run() == {}
+
+        assert [c[1]['overrides'] for c in
+                self.manager.install.call_args_list] == [
+            {'apt-get': ['broken', 'flac']}, {'apt-get': ['broken']},
+            {'apt-get': ['flac']}
+        ]
+        log.warning.assert_called_once_with(
+            'Failed to install system packages of skill-a: broken'
+        )
+
+    def test_missing_exes(self):
+        skill_a, skill_b = skill_mock('skill-a'), skill_mock('skill-b')
+        rollback_a, rollback_b = Mock(), Mock()
+        self.batch.add(skill_a, [], exes=['mpg123', 'sox'],
+                       rollback=rollback_a)
+        self.batch.add(skill_b, [], exes=['mpg123'], rollback=rollback_b)
+        with patch('msm.system_packages.shutil.which',
+                   side_effect=lambda exe: exe == 'mpg123') as which:
+            failures = self.batch.run()
+
+        assert list(failures) == [skill_a]
+        assert str(failures[skill_a]) == 'Could not find exes: sox'
+        assert which.call_count == 2
+        rollback_a.assert_called_once_with()
+        rollback_b.assert_not_called()
+        self.manager.install.assert_not_called()
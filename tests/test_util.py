@@ -0,0 +1,160 @@
+# Copyright (c) 2018 Mycroft AI, Inc.
+#
+# This file is part of Mycroft Skills Manager
+# (see https://github.com/MycroftAI/mycroft-skills-manager).
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from unittest import TestCase
+from unittest.mock import patch
+
+from git import GitCommandError
+
+from msm import SkillEntry
+from msm.util import LruCache, get_git_sha, read_git_ref, \
+    read_git_remote_url
+
+from helpers import TempDirTestCase, git
+
+
+class TestReadGitRef(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = self.temp_dir.joinpath('repo')
+        self.repo.mkdir()
+        git(self.repo, 'init', '-q')
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'First')
+        self.first = git(self.repo, 'rev-parse', 'HEAD')
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'Second')
+        self.second = git(self.repo, 'rev-parse', 'HEAD')
+
+    def test_loose_ref(self):
+        assert read_git_ref(str(self.repo)) == self.second
+        assert read_git_ref(str(self.repo), 'refs/heads/master') == \
+            self.second
+
+    def test_packed_ref(self):
+        git(self.repo, 'tag', 'v1', self.first)
+        git(self.repo, 'pack-refs', '--all')
+        assert not self.repo.joinpath('.git', 'refs', 'heads',
+                                      'master').exists()
+        assert read_git_ref(str(self.repo)) == self.second
+        assert read_git_ref(str(self.repo), 'refs/tags/v1') == self.first
+
+    def test_detached_head(self):
+        git(self.repo, 'checkout', '-q', self.first)
+        assert read_git_ref(str(self.repo)) == self.first
+
+    def test_symbolic_remote_head(self):
+        clone = self.temp_dir.joinpath('clone')
+        git(self.temp_dir, 'clone', '-q', str(self.repo), str(clone))
+        assert read_git_ref(str(clone), 'refs/remotes/origin/HEAD') == \
+            self.second
+
+    def test_worktree(self):
+        worktree = self.temp_dir.joinpath('worktree')
+        git(self.repo, 'worktree', 'add', '-q', '--detach', str(worktree),
+            self.first)
+        assert worktree.joinpath('.git').is_file()
+        assert read_git_ref(str(worktree)) == self.first
+        assert read_git_ref(str(worktree), 'refs/heads/master') == \
+            self.second
+
+    def test_unresolvable(self):
+        assert read_git_ref(str(self.temp_dir)) is None
+        assert read_git_ref(str(self.repo), 'refs/heads/missing') is None
+
+    def test_get_git_sha_without_git_process(self):
+        with patch('msm.util.Git') as git_mock:
+            assert get_git_sha(str(self.repo)) == self.second
+        git_mock.assert_not_called()
+
+    def test_get_git_sha_fallback(self):
+        with patch('msm.util.read_git_ref', return_value=None):
+            assert get_git_sha(str(self.repo)) == self.second
+        with self.assertRaises(GitCommandError):
+            get_git_sha(str(self.temp_dir))
+
+
+class TestReadGitRemoteUrl(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = self.temp_dir.joinpath('repo')
+        self.repo.mkdir()
+        git(self.repo, 'init', '-q')
+        self.url = 'https://github.com/MycroftAI/skill-weather.git'
+        git(self.repo, 'remote', 'add', 'origin', self.url)
+
+    def _write_config(self, content):
+        self.repo.joinpath('.git', 'config').write_text(content)
+
+    def test_origin_url(self):
+        assert read_git_remote_url(str(self.repo)) == self.url
+        assert read_git_remote_url(str(self.repo), 'upstream') is None
+        assert SkillEntry.find_git_url(str(self.repo)) == self.url
+
+    def test_quoted_value_and_comments(self):
+        self._write_config(
+            '[core]\n\tbare = false\n'
+            '[Remote "origin"] ; comment\n'
+            '\tURL = "https://example.com/a;b" # comment\n'
+        )
+        assert read_git_remote_url(str(self.repo)) == \
+            'https://example.com/a;b'
+
+    def test_cached_until_modified(self):
+        assert read_git_remote_url(str(self.repo)) == self.url
+        with patch('msm.util._parse_remote_urls') as parse_mock:
+            assert read_git_remote_url(str(self.repo)) == self.url
+        parse_mock.assert_not_called()
+
+        new_url = 'https://github.com/forslund/skill-cocktails'
+        git(self.repo, 'remote', 'set-url', 'origin', new_url)
+        assert read_git_remote_url(str(self.repo)) == new_url
+
+    def test_worktree_uses_shared_config(self):
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'First')
+        worktree = self.temp_dir.joinpath('worktree')
+        git(self.repo, 'worktree', 'add', '-q', str(worktree))
+        assert read_git_remote_url(str(worktree)) == self.url
+
+    def test_unsupported_config_falls_back(self):
+        self._write_config(
+            '[include]\n\tpath = other.config\n'
+            '[remote "origin"]\n\turl = {}\n'.format(self.url)
+        )
+        assert read_git_remote_url(str(self.repo)) is None
+        assert SkillEntry.find_git_url(str(self.repo)) == self.url
+
+    def test_not_a_checkout(self):
+        assert read_git_remote_url(str(self.temp_dir)) is None
+        assert SkillEntry.find_git_url(str(self.temp_dir)) == ''
+
+
+class TestLruCache(TestCase):
+    def test_least_recently_used_dropped(self):
+        cache = LruCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert (cache.hits, cache.misses) == (3, 1)
+        cache.clear()
+        assert len(cache) == 0